@@ -1,13 +1,30 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import sys
+
 import numpy as np
 import scipy as sp
 
 import sympy as smp  # NOQA
 
-from sympy import lambdify, Matrix
-from scipy.optimize import newton_krylov  # NOQA
+from sympy import cse, lambdify, srepr, symbols, Dummy, IndexedBase, Matrix, Symbol, sympify
+from sympy.printing.pycode import PythonCodePrinter
+from sympy.utilities.autowrap import autowrap
+from scipy.optimize import newton_krylov, NoConvergence  # NOQA
+from scipy.sparse import csc_matrix
+from scipy.sparse.linalg import splu
 
 from typing import Iterable
-from collections import OrderedDict
+
+from dian import __version__
+from dian.utils import jacobian, jit, llvm_lambdify
+
+logger = logging.getLogger(__name__)
+
+# version of the modules written by `DAE.generate_specialized`, to be increased when the generated code changes
+_SPECIALIZED_VERSION = 1
 
 
 class DAE(object):
@@ -49,6 +66,25 @@ class DAE(object):
         self.g_func = None
         self.f_func = None
 
+        # sparse Jacobian dg/dy in triplets. `self.gy` holds the (row, col, expr) of the nonzeros, and
+        # `self.gy_func` returns the values of the nonzeros in the same order
+        self.gy_rows = None
+        self.gy_cols = None
+        self.gy_func = None
+
+        # residual and Jacobian values broadcasting over a trailing batch axis of the variables, created by
+        # `lambdify_algebs_batch`
+        self.g_batch_func = None
+        self.gy_batch_func = None
+
+        # real-valued symbols for `self.y` and `self.g` in these symbols, created by `make_algebs_real`
+        self.y_real = None
+        self.g_real = None
+
+        # CSC structure of the Jacobian in (indices, indptr, order), where `order` maps the stored nonzeros
+        # to the triplets. Keyed on the column permutation as a tuple, or `None` for the original order
+        self._gy_structure = dict()
+
         self.m = 0
         self.n = 0
 
@@ -56,7 +92,7 @@ class DAE(object):
         assert var_type in ('x', 'y')
 
         n_element = device.n
-        out = OrderedDict()
+        out = dict()
         for var in var_name:
             out[var] = np.ndarray((n_element, ), dtype=int)
 
@@ -113,6 +149,17 @@ class DAE(object):
         self.y_num = np.zeros((self.m, ))
         self.g_num = np.zeros((self.m, ))
 
+        # equations are rebuilt and need to be lambdified again
+        self.g_func = None
+        self.f_func = None
+        self.gy = []
+        self.gy_func = None
+        self.g_batch_func = None
+        self.gy_batch_func = None
+        self._gy_structure = dict()
+        self.y_real = None
+        self.g_real = None
+
     @property
     def y_pairs(self):
         """
@@ -145,28 +192,515 @@ class DAE(object):
         out += f'dae.y_num = {self.y_num}'
         out += f'dae.x_num = {self.x_num}'
 
-    def lambdify_algebs(self):
+    def make_algebs_real(self):
+        """
+        Replace the variables in `self.g` with real-valued symbols, stored in `self.y_real` and `self.g_real`.
+
+        With real variables, `re`, `im` and `conjugate` in the equations evaluate, and the complex phasors
+        expand to products of `sin` and `cos` of the variables, which are shared by all equations of the
+        connected elements.
+
+        Returns
+        -------
+        None
+        """
+        self.y_real = [Dummy(sym.name, real=True) for sym in self.y]
+        real_map = dict(zip(self.y, self.y_real))
+        self.g_real = [sympify(eq).xreplace(real_map) for eq in self.g]
+
+    def lambdify_algebs(self, backend='numpy'):
         """Convert algebraic equations in `self.g` to lambdified function calls and store in `self.g_func`.
 
-        The lambdified function takes an argument of variable arrays.
+        The lambdified function takes an argument of variable arrays. It is generated once and reused by
+        `solve_algebs` until the equations are rebuilt by `initialize_xyfg_empty`. The equations in real
+        variables are used, and the common subexpressions are eliminated before the code is generated.
+        The function is compiled with numba if available.
+
+        Parameters
+        ----------
+        backend : str
+            `numpy` for the lambdified function, `cython` for a C extension module built by
+            `sympy.utilities.autowrap.autowrap`, which requires Cython and a C compiler, `llvm` for
+            `symengine.Lambdify` with the LLVM backend, which falls back to `numpy` if not available, or
+            `kernels` for the numeric kernels of the devices from `make_kernels`, which also set the Jacobian
 
         Returns
         -------
         None
         """
-        self.g_func = lambdify((self.y, ), self.g)
+        assert backend in ('numpy', 'cython', 'llvm', 'kernels')
+
+        if backend == 'kernels':
+            self.make_kernels()
+            return
+
+        if self.g_real is None:
+            self.make_algebs_real()
+
+        if backend == 'cython':
+            self.g_func = self._autowrap_algebs()
+            return
+
+        if backend == 'llvm':
+            func = llvm_lambdify(self.y_real, self.g_real)
+            if func is not None:
+                self.g_func = func
+                return
+            logger.warning('symengine with LLVM is not available. Falling back to the numpy backend.')
+
+        self.g_func = self._lambdify_real(self.g_real)
 
-    def solve_algebs(self, method='newton_krylov'):
+    def _lambdify_real(self, exprs):
         """
-        Solve the algebraic equations numerically
+        Lambdify `exprs` in the real variables `self.y_real` into a function of the array of variables, which
+        is compiled with numba if available. The variables are indexed from the array in the generated code,
+        and the values are returned as a tuple, which numba compiles faster than a list.
+
+        Parameters
+        ----------
+        exprs : list
+            A list of expressions in `self.y_real`
+
+        Returns
+        -------
+        function : the function taking the array of variables and returning an array of `exprs`
+        """
+        y = IndexedBase('y')
+        indexed = {sym: y[i] for i, sym in enumerate(self.y_real)}
+        func = jit(lambdify([y], tuple(sympify(expr).xreplace(indexed) for expr in exprs), modules='numpy',
+                            cse=True), fastmath=True)
+        return lambda y: np.array(func(np.asarray(y, dtype=float)), dtype=float)
+
+    def _autowrap_algebs(self):
+        """
+        Compile the algebraic equations into a C extension module with the Cython backend of `autowrap`
+
+        Returns
+        -------
+        function : the residual function taking the array of algebraic variables
+        """
+        # the generated C code needs plain variable names
+        args = symbols(f'y0:{self.m}', real=True)
+        g_args = Matrix([eq.xreplace(dict(zip(self.y_real, args))) for eq in self.g_real])
+
+        func = autowrap(g_args, args=args, backend='cython')
+        return lambda y: func(*y).ravel()
+
+    def make_jac_symbolic(self):
+        """
+        Generate the sparse Jacobian matrix dg/dy in triplets and lambdify the values of the nonzeros.
+
+        The equations in real variables from `make_algebs_real` are differentiated. The triplets are stored in
+        `self.gy`, the row and column indices in `self.gy_rows` and `self.gy_cols`, and the function of the
+        values in `self.gy_func`.
+
+        Returns
+        -------
+        None
+        """
+        if self.g_real is None:
+            self.make_algebs_real()
+
+        gy = jacobian(self.g_real, self.y_real)
+
+        self.gy = [(row, col, gy[row, col]) for row in range(gy.rows) for col in range(gy.cols)
+                   if gy[row, col] != 0]
+        self.gy_rows = np.array([row for row, _, _ in self.gy], dtype=int)
+        self.gy_cols = np.array([col for _, col, _ in self.gy], dtype=int)
+
+        self.gy_func = self._lambdify_real([expr for _, _, expr in self.gy])
+        self._gy_structure = dict()
+
+    def make_kernels(self):
+        """
+        Set `self.g_func` and `self.gy_func` from the numeric kernels of the devices created by
+        `DeviceBase.make_gcall_numeric`. Each kernel evaluates one equation for all elements of a device, and
+        the values are accumulated into the residual at the dae addresses. The symbolic equations in `self.g` are
+        not used, so that the symbol substitution stages are not needed.
+
+        The Jacobian triplets of all kernels are merged into unique `(row, col)` nonzeros in `self.gy_rows` and
+        `self.gy_cols`.
 
         Returns
         -------
         None
         """
+        devices = [self.system.__dict__[dev] for dev in self.system.devices]
+        devices = [device for device in devices if device.n > 0]
+        for device in devices:
+            device.make_gcall_numeric()
+
+        g_kernels = [item for device in devices for item in device._gcall_numeric]
+        gy_kernels = [item for device in devices for item in device._gy_numeric]
+        m = self.m
+
+        g_addr = np.concatenate([addr for addr, _ in g_kernels] + [np.zeros((0, ), dtype=int)])
+
+        def g_func(y):
+            y = np.asarray(y, dtype=float)
+            values = [func(y) for _, func in g_kernels]
+            return np.bincount(g_addr, weights=np.concatenate(values + [np.zeros((0, ))]), minlength=m)
+
+        rows = np.concatenate([rows for rows, _, _ in gy_kernels] + [np.zeros((0, ), dtype=int)])
+        cols = np.concatenate([cols for _, cols, _ in gy_kernels] + [np.zeros((0, ), dtype=int)])
+        keys, slots = np.unique(rows * m + cols, return_inverse=True)
+        n_nonzero = len(keys)
+
+        def gy_func(y):
+            y = np.asarray(y, dtype=float)
+            values = [func(y) for _, _, func in gy_kernels]
+            return np.bincount(slots, weights=np.concatenate(values + [np.zeros((0, ))]), minlength=n_nonzero)
+
+        self.g_func = g_func
+        self.gy_func = gy_func
+        self.gy = []
+        self.gy_rows = keys // m
+        self.gy_cols = keys % m
+        self._gy_structure = dict()
+
+    def generate_specialized(self, path):
+        """
+        Write a Python module to `path` with the residual and the Jacobian of the current equations in
+        straight-line code: one assignment per common subexpression and per equation, with the parameter
+        values already substituted. The variables are indexed from the argument array by position.
+
+        The module defines `m`, `gy_rows` and `gy_cols`, `g(y)` for the residual, and `gy(y)` for the
+        values of the Jacobian nonzeros. Load the module with `load_specialized`.
+
+        Parameters
+        ----------
+        path : str
+            The path of the module file to write
+
+        Returns
+        -------
+        None
+        """
+        # after `load_specialized`, `self.gy_func` is set without the symbolic Jacobian and the real equations
+        if self.gy_func is None or self.g_real is None or len(self.gy) != len(self.gy_rows):
+            self.make_jac_symbolic()
+
+        # generated code uses the variable names; `y_real` are dummies whose names are not unique
+        names = [Symbol(f'y_{i}_{sym.name}') for i, sym in enumerate(self.y)]
+        name_map = dict(zip(self.y_real, names))
+        printer = PythonCodePrinter({'fully_qualified_modules': False, 'standard': 'python3'})
+
+        lines = ['"""Residual and Jacobian generated by `dian.dae.DAE.generate_specialized`. Do not edit."""',
+                 'from math import *  # NOQA',
+                 'import numpy as np',
+                 '',
+                 f'm = {self.m}',
+                 f'gy_rows = np.array({self.gy_rows.tolist()}, dtype=int)',
+                 f'gy_cols = np.array({self.gy_cols.tolist()}, dtype=int)',
+                 ]
+
+        for func_name, exprs in (('g', self.g_real), ('gy', [expr for _, _, expr in self.gy])):
+            replacements, reduced = cse([sympify(expr).xreplace(name_map) for expr in exprs])
+
+            lines.extend(['', '', f'def {func_name}(y):'])
+            lines.extend(f'    {name} = y[{i}]' for i, name in enumerate(names))
+            lines.extend(f'    {sym} = {printer.doprint(expr)}' for sym, expr in replacements)
+            lines.append(f'    out = np.empty({len(reduced)})')
+            lines.extend(f'    out[{i}] = {printer.doprint(expr)}' for i, expr in enumerate(reduced))
+            lines.append('    return out')
+
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def load_specialized(self, path):
+        """
+        Load the residual and the Jacobian from a module written by `generate_specialized` into `self.g_func`
+        and `self.gy_func`. The functions are compiled with numba if available, with the compiled code cached
+        next to the module.
+
+        Parameters
+        ----------
+        path : str
+            The path of the module file
+
+        Returns
+        -------
+        module : the loaded module
+        """
+        # the module is registered under a name stable across processes, which the numba cache imports
+        # when loading the compiled code
+        name = f'dian_specialized_{hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]}'
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+
+        assert module.m == self.m, f'{path} is generated for {module.m} algebraic variables instead of {self.m}'
+
+        self.g_func = jit(module.g, cache=True, fastmath=True)
+        self.gy_func = jit(module.gy, cache=True, fastmath=True)
+        self.gy_rows = module.gy_rows
+        self.gy_cols = module.gy_cols
+        self._gy_structure = dict()
+        return module
+
+    def load_cached_specialized(self, cache_dir, build=None):
+        """
+        Load the residual and the Jacobian from the module generated by `generate_specialized` in `cache_dir`.
+        The module is generated only if not yet in the cache. The numba compiled code is cached in the same
+        directory.
+
+        The module file is named by a hash of `System.model_key`, which covers the model definitions and the
+        parameter data, so that a cached module is found before the symbolic stages run. Without a system, the
+        variables and the equations are hashed. The hash is salted with `_SPECIALIZED_VERSION` and the version
+        of dian, so that modules written by another version of the generator are not loaded.
+
+        Parameters
+        ----------
+        cache_dir : str
+            The directory of the cached modules, created if it does not exist
+        build : callable, optional
+            Called without arguments before the module is generated, to build the equations in `self.g`. Not
+            called if the module is cached
+
+        Returns
+        -------
+        module : the loaded module
+        """
+        model = srepr([self.y, self.g]) if self.system is None else self.system.model_key()
+        salt = f'{_SPECIALIZED_VERSION}:{__version__}:'
+        key = hashlib.sha256((salt + model).encode()).hexdigest()[:16]
+        path = os.path.join(cache_dir, f'dian_specialized_{key}.py')
+
+        if not os.path.isfile(path):
+            if build is not None:
+                build()
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            self.generate_specialized(tmp_path)
+            os.replace(tmp_path, path)  # processes sharing the cache never load a partially written module
+        else:
+            logger.debug('Loading cached specialized module %s', path)
+
+        return self.load_specialized(path)
+
+    def _jac_structure(self, perm_c=None):
+        """
+        Get the CSC structure of the Jacobian, optionally with the columns permuted by `perm_c`, such that
+        the matrix with the values `vals` of the triplets is `csc_matrix((vals[order], indices, indptr))`
+
+        Parameters
+        ----------
+        perm_c : np.ndarray or None
+            The column permutation, where column `j` of the permuted matrix is column `perm_c[j]`
+
+        Returns
+        -------
+        tuple : (indices, indptr, order)
+        """
+        key = None if perm_c is None else tuple(perm_c)
+        if key not in self._gy_structure:
+            cols = self.gy_cols if perm_c is None else np.argsort(perm_c)[self.gy_cols]
+            pattern = csc_matrix((np.arange(1, len(self.gy_rows) + 1), (self.gy_rows, cols)),
+                                 shape=(self.m, self.m))
+            self._gy_structure[key] = (pattern.indices, pattern.indptr, pattern.data - 1)
+
+        return self._gy_structure[key]
+
+    def eval_jac(self, y, perm_c=None):
+        """
+        Evaluate the sparse Jacobian matrix dg/dy at `y`
+
+        Parameters
+        ----------
+        y : np.ndarray
+            The values of algebraic variables
+        perm_c : np.ndarray or None
+            The column permutation to apply, as in `self._jac_structure`
+
+        Returns
+        -------
+        scipy.sparse.csc_matrix : the Jacobian matrix
+        """
+        if self.gy_func is None:
+            self.make_jac_symbolic()
+
+        indices, indptr, order = self._jac_structure(perm_c)
+        return csc_matrix((self.gy_func(y)[order], indices, indptr), shape=(self.m, self.m))
+
+    def newton_sparse(self, y0, tol=1e-8, max_iter=20):
+        """
+        Solve the algebraic equations with the Newton method using the analytical sparse Jacobian.
+
+        The sparsity pattern of the Jacobian does not change across iterations. The fill-reducing column
+        ordering is computed in the first factorization only, and later iterations factorize the Jacobian with
+        its columns already permuted.
+
+        Parameters
+        ----------
+        y0 : np.ndarray
+            The initial values of algebraic variables
+        tol : float
+            The tolerance on the maximum absolute mismatch of the equations
+        max_iter : int
+            The maximum number of iterations
+
+        Returns
+        -------
+        np.ndarray : the solution
+        """
         if self.g_func is None:
             self.lambdify_algebs()
 
+        y = np.array(y0, dtype=float)
+        perm_c = None
+        for _ in range(max_iter):
+            g = self.g_func(y)
+            if np.max(np.abs(g)) < tol:
+                return y
+
+            if perm_c is None:
+                lu = splu(self.eval_jac(y))
+                perm_c = lu.perm_c
+                dy = lu.solve(g)
+            else:
+                lu = splu(self.eval_jac(y, perm_c=perm_c), permc_spec='NATURAL')
+                dy = np.empty_like(g)
+                dy[perm_c] = lu.solve(g)
+
+            y = y - dy
+
+        if np.max(np.abs(self.g_func(y))) < tol:
+            return y
+        raise NoConvergence(y)
+
+    def lambdify_algebs_batch(self):
+        """
+        Lambdify the residual and the values of the Jacobian nonzeros into `self.g_batch_func` and
+        `self.gy_batch_func`, which take variables of shape `(m, n_batch)` and return arrays of shape
+        `(m, n_batch)` and `(nnz, n_batch)`, respectively. The functions are generated with NumPy without
+        numba, so that each operation is vectorized over the batch.
+
+        Returns
+        -------
+        None
+        """
+        if self.gy_func is None or len(self.gy) != len(self.gy_rows):
+            self.make_jac_symbolic()
+
+        def broadcast(func):
+            def wrapped(y):
+                values = func(*y)
+                out = np.empty((len(values), np.shape(y)[1]))
+                for i, value in enumerate(values):
+                    out[i] = value  # rows constant in `y` are scalars
+                return out
+            return wrapped
+
+        self.g_batch_func = broadcast(lambdify(self.y_real, self.g_real, modules='numpy', cse=True))
+        self.gy_batch_func = broadcast(lambdify(self.y_real, [expr for _, _, expr in self.gy],
+                                                modules='numpy', cse=True))
+
+    def solve_algebs_batch(self, y0_batch, tol=1e-8, max_iter=20):
+        """
+        Solve the algebraic equations from a batch of initial values with the Newton method.
+
+        The residual and the Jacobian are evaluated for the whole batch at once. The Jacobians of all the
+        cases share the sparsity pattern and are assembled into one block-diagonal matrix, which is factorized
+        and solved once per iteration.
+
+        Parameters
+        ----------
+        y0_batch : np.ndarray
+            The initial values of algebraic variables in shape `(m, n_batch)`
+        tol : float
+            The tolerance on the maximum absolute mismatch of the equations over the batch
+        max_iter : int
+            The maximum number of iterations
+
+        Returns
+        -------
+        np.ndarray : the solutions in shape `(m, n_batch)`
+        """
+        if self.g_batch_func is None:
+            self.lambdify_algebs_batch()
+
+        y = np.array(y0_batch, dtype=float)
+        m, n_batch = y.shape
+        assert m == self.m, f'y0_batch has {m} rows instead of {self.m}'
+
+        # block-diagonal structure with the Jacobian of case `k` in block `k`
+        indices, indptr, order = self._jac_structure()
+        nnz = len(indices)
+        offsets = np.arange(n_batch)[:, None]
+        block_indices = (indices[None, :] + m * offsets).ravel()
+        block_indptr = np.append((indptr[None, :-1] + nnz * offsets).ravel(), nnz * n_batch)
+
+        for _ in range(max_iter):
+            g = self.g_batch_func(y)
+            if np.max(np.abs(g)) < tol:
+                return y
+
+            data = self.gy_batch_func(y)[order].T.ravel()
+            jac = csc_matrix((data, block_indices, block_indptr), shape=(m * n_batch, m * n_batch))
+            dy = splu(jac).solve(g.T.ravel())
+            y = y - dy.reshape(n_batch, m).T
+
+        if np.max(np.abs(self.g_batch_func(y))) < tol:
+            return y
+        raise NoConvergence(y)
+
+    def root_dense(self, y0, method='hybr'):
+        """
+        Solve the algebraic equations with `scipy.optimize.root` using the analytical Jacobian as a dense
+        matrix. Suitable for small systems, where MINPACK's `hybr` or `lm` converges with a few dense LU
+        factorizations.
+
+        Parameters
+        ----------
+        y0 : np.ndarray
+            The initial values of algebraic variables
+        method : str
+            The method of `scipy.optimize.root` that uses the Jacobian, such as `hybr` or `lm`
+
+        Returns
+        -------
+        np.ndarray : the solution
+        """
+        if self.g_func is None:
+            self.lambdify_algebs()
+
+        ret = sp.optimize.root(self.g_func, np.array(y0, dtype=float), method=method,
+                               jac=lambda y: self.eval_jac(y).toarray())
+        if not ret.success:
+            raise NoConvergence(ret.x)
+        return ret.x
+
+    def solve_algebs(self, method='newton_krylov', dense_threshold=100):
+        """
+        Solve the algebraic equations numerically
+
+        Parameters
+        ----------
+        method : str
+            The name of a Jacobian-free solver in `scipy.optimize`, `newton_krylov` by default,
+            `newton_sparse` for the Newton method with the analytical sparse Jacobian, `hybr` or `lm` for
+            `scipy.optimize.root` with the analytical Jacobian, or `auto` to choose by the number of
+            algebraic variables
+        dense_threshold : int
+            With `method='auto'`, systems with up to `dense_threshold` algebraic variables are solved by `hybr`
+            with the dense Jacobian, and larger ones by `newton_sparse`
+
+        Returns
+        -------
+        np.ndarray : the solution
+        """
+        if self.g_func is None:
+            self.lambdify_algebs()
+
+        if method == 'auto':
+            method = 'hybr' if self.m <= dense_threshold else 'newton_sparse'
+
+        if method == 'newton_sparse':
+            return self.newton_sparse(self.y_num)
+        elif method in ('hybr', 'lm'):
+            return self.root_dense(self.y_num, method=method)
+
         # NOTE: not all methods converge.
         #       Not working: newton, anderson
         #       working: newton_krylov
@@ -1,21 +1,233 @@
 import numpy as np
+import functools
 import logging
+import numbers
 import pprint
-from collections import OrderedDict
+from collections.abc import Mapping
 
 import numpy as np  # NOQA
-from sympy import Array, sympify  # NOQA
-from sympy import symbols, MatrixSymbol  # NOQA
-from sympy.tensor.array import MutableDenseNDimArray
+from sympy import Add, Array, Basic, Float, S, Tuple, lambdify, srepr, sympify  # NOQA
+from sympy import symbols, Symbol, MatrixBase, MatrixSymbol  # NOQA
+from sympy.printing.str import StrPrinter
 
-from dian.utils import non_commutative_sympify
+from dian.utils import cached_sympify, jit, non_commutative_sympify
 
 logger = logging.getLogger(__name__)
 
+# maximum number of entries in each of the process-wide caches below. Entries are keyed on the equations and
+# their inputs, so they never go stale; the least recently used ones are dropped
+_CACHE_SIZE = 4096
+
+# metadata that define the equations of a device, printed by `DeviceBase.model_repr`
+_MODEL_METADATA = ('_param_int', '_param_int_default', '_param_int_computed', '_param_int_custom', '_foreign_keys',
+                   '_algeb_int', '_algeb_intf', '_algeb_ext', '_state_int', '_var_int_computed', '_var_int_custom',
+                   '_var_value_initial', '_gcall_int', '_gcall_ext', '_fcall_int', '_special_flags')
+
+
+def _cached_subs(equation, sym_list, simultaneous=False, xreplace=False):
+    """
+    Memoized `equation.subs(sym_list)` or `equation.xreplace(dict(sym_list))`. Falls back to an uncached
+    substitution if the equation or any substitute is unhashable, such as a mutable matrix, or a list of
+    parameter values.
+
+    Parameters
+    ----------
+    equation : sympy.Basic
+        The equation singleton
+    sym_list : list
+        A list of (symbol, substitute) pairs
+    simultaneous : bool
+        Passed to `sympy.Basic.subs`
+    xreplace : bool
+        Use `xreplace` instead of `subs`. Only valid if all the symbols to replace are atoms.
+
+    Returns
+    -------
+    The equation with symbols substituted
+    """
+    # include the type of substitutes so that, e.g., `1` and `1.0` do not share a cache entry
+    key = tuple((sym, type(val), val) for sym, val in sym_list)
+    try:
+        hash((equation, key))
+    except TypeError:
+        return _subs(equation, sym_list, simultaneous=simultaneous, xreplace=xreplace)
+    return _memoized_subs(equation, key, simultaneous, xreplace)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _memoized_subs(equation, key, simultaneous, xreplace):
+    """Substitution cached by `functools.lru_cache` for `_cached_subs`, with `key` of (symbol, type, value)"""
+    return _subs(equation, [(sym, val) for sym, _, val in key], simultaneous=simultaneous, xreplace=xreplace)
+
+
+def _subs(equation, sym_list, simultaneous=False, xreplace=False):
+    """Uncached substitution called by `_cached_subs`"""
+    if xreplace:
+        # `xreplace` does not sympify the substitutes by itself. Keep mutable matrices as they are
+        return equation.xreplace({sym: val if isinstance(val, MatrixBase) else sympify(val)
+                                  for sym, val in sym_list})
+    return equation.subs(sym_list, simultaneous=simultaneous)
+
+
+class _ExactStrPrinter(StrPrinter):
+    """String printer that prints integers and rationals exactly, and floats with all their digits and precision"""
+
+    def __init__(self, settings=None):
+        super(_ExactStrPrinter, self).__init__(dict(settings or {}, sympy_integers=True))
+
+    def _print_Float(self, expr):
+        return srepr(expr)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _cached_lambdify(args, equation, modules='numpy'):
+    """
+    Lambdify `equation` with the argument symbols `args` once and reuse the function afterwards.
+
+    Parameters
+    ----------
+    args : tuple
+        A tuple of the argument symbols
+    equation : sympy.Basic
+        The equation to lambdify
+    modules : str
+        Passed to `sympy.lambdify`. With `'sympy'`, the equation is printed with exact integers and rationals,
+        and with floats of full precision, so that calling the function with sympy arguments rebuilds the
+        expression as `xreplace` would. The common subexpressions are eliminated, so that each one is built
+        once per call, such as `a1 - a2` in `v1 * v2 * (g * cos(a1 - a2) + b * sin(a1 - a2))`
+
+    Returns
+    -------
+    function : the lambdified function
+    """
+    # `lambdify` registers the generated source with `linecache` until the function is garbage collected,
+    # which happens when it is dropped from the cache
+    if modules == 'sympy':
+        return lambdify(args, equation, modules=[{'S': S, 'Float': Float}, 'sympy'], printer=_ExactStrPrinter(),
+                        cse=True)
+    return lambdify(args, equation, modules=modules)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _numeric_kernel(args, equation):
+    """
+    Lambdify `equation` with the argument symbols `args` into a NumPy function compiled with numba if available.
+    Kernels are cached by the equation and the arguments, so that all the devices with the same equation share
+    one compiled function.
+
+    Parameters
+    ----------
+    args : tuple
+        A tuple of the argument symbols
+    equation : sympy.Basic
+        The equation to compile
+
+    Returns
+    -------
+    function : the kernel taking one array for each argument
+    """
+    return jit(lambdify(args, equation, modules='numpy', cse=True), fastmath=True)
+
+
+def _bind_kernel(equation, args, sources, n):
+    """
+    Bind the arguments of the kernel of `equation` to the variables or the parameter values in `sources`
+
+    Parameters
+    ----------
+    equation : sympy.Basic
+        The equation
+    args : tuple
+        A tuple of the argument symbols
+    sources : list
+        A list of `(is_variable, array)` for `args`. `array` is the dae addresses of a variable, or the
+        parameter values
+    n : int
+        The number of elements
+
+    Returns
+    -------
+    function : the function taking the array of algebraic variables and returning the values of `equation`
+    for the `n` elements
+    """
+    if not equation.free_symbols:
+        values = np.full((n, ), float(equation))
+        return lambda y: values
+
+    kernel = _numeric_kernel(args, equation)
+
+    def evaluate(y):
+        return np.broadcast_to(kernel(*[y[array] if is_variable else array for is_variable, array in sources]),
+                               (n, ))
+    return evaluate
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _split_param_linear(equation, variables):
+    """
+    Split `equation` as `sum(coeff * factor) + const`, where the coefficients and the constant are free of
+    `variables`, and the factors depend only on `variables`. Terms with the same factor are merged.
+
+    Parameters
+    ----------
+    equation : sympy.Basic
+        A commutative equation singleton
+    variables : tuple
+        The variable symbols
+
+    Returns
+    -------
+    tuple : (const, tuple of (coeff, factor))
+    """
+    const, dependent = equation.as_independent(*variables, as_Add=True)
+    coeffs = dict()
+    for term in Add.make_args(dependent):
+        coeff, factor = term.as_independent(*variables, as_Add=False)
+        coeffs[factor] = coeffs.get(factor, S.Zero) + coeff
+    return const, tuple((coeff, factor) for factor, coeff in coeffs.items())
+
+
+def _is_numeric(value):
+    """Check if `value` is a Python or NumPy number that can be passed to NumPy functions"""
+    return isinstance(value, (numbers.Number, np.number)) and not isinstance(value, Basic)
+
+
+def _numeric_column(values, n):
+    """
+    Get the first `n` of `values` as a NumPy array of floats or complex numbers. Numeric arrays are sliced
+    without checking the elements.
+
+    Parameters
+    ----------
+    values : np.ndarray, list or sympy.Array
+        The values to convert
+    n : int
+        The number of values
+
+    Returns
+    -------
+    np.ndarray or None : the numeric array, or None if any of the values is not a number
+    """
+    column = values[:n] if isinstance(values, np.ndarray) else None
+    if column is None or column.dtype.kind not in 'biufc':
+        items = list(values[:n])
+        if not all(_is_numeric(val) for val in items):
+            return None
+        column = np.array(items)
+
+    if column.dtype.kind in 'biu':
+        column = column.astype(float)  # avoid integer overflow and negative integer powers
+    return column
+
 
 class DeviceBase(object):
     """
     Base class for devices with universal properties and functions
+
+    Symbols, parameters and equations are stored as instance attributes named after the metadata, e.g.
+    `self.v` for the variable `v` and `self._v` for its equation. Since the attribute set is given by the
+    metadata of each device, `__slots__` is not used; hot paths bind `self.__dict__` and the looked-up
+    attributes to locals instead.
     """
 
     #  {Constant, Symbol {scalar, vector {parameter, variable{internal, external}, matrix}, Anything}
@@ -26,58 +238,78 @@ class DeviceBase(object):
         self.idx = []
 
         # options for the whole class
-        self._options = OrderedDict()
+        self._options = dict()
 
-        # parameter data stored in the value of the OrderedDictionary, includes params defined in `_param_int`,
+        # parameter data stored in the values of the dictionary, includes params defined in `_param_int`,
         # `_param_int_computed`, `_param_int_custom`, `_param_ext`, and `_param_ext_computed`
-        self._param_data = OrderedDict()
+        self._param_data = dict()
 
         # key: parameter name, value: (list of symbols, list of values)
-        self._param_sym_val_pair = OrderedDict()
+        self._param_sym_val_pair = dict()
+
+        # Metadata given by `self._class_metadata` can be defined by device classes as class attributes, which
+        # all instances read without copies. Otherwise, the defaults below are created for each instance and
+        # extended in `__init__` of the device
 
         # default set of parameters
-        self._param_int = ['name', 'u']
-        self._param_int_default = {'name': '', 'u': 1}
-        self._param_int_non_computational = ['name']
-        self._param_int_mandatory = []
+        self._param_int = self._class_metadata('_param_int', ['name', 'u'])
+        self._param_int_default = self._class_metadata('_param_int_default', {'name': '', 'u': 1})
+        self._param_int_non_computational = self._class_metadata('_param_int_non_computational', ['name'])
+        self._param_int_mandatory = self._class_metadata('_param_int_mandatory', [])
 
         # computed internal parameters in a list of (parameter, equation)
-        self._param_int_computed = OrderedDict()
+        self._param_int_computed = dict()
 
         # internal parameters that are computed with custom functions
-        self._param_int_custom = OrderedDict()
-        self._param_int_custom_symbolic = OrderedDict()
+        self._param_int_custom = dict()
+        self._param_int_custom_symbolic = dict()
 
         # external parameters before any computation in tuples (device, original_name, new_name)
-        self._param_ext = []  # TODO: may change to OrderedDict; method to update external parameters
+        self._param_ext = []  # TODO: may change to dict; method to update external parameters
 
         # external parameters that are computed by the external device in tuples (device, original name, new_name)
         self._param_ext_computed = []
-        # TODO: may change to OrderedDict, method to update computed external parameters
+        # TODO: may change to dict, method to update computed external parameters
 
         # store the idx to internal index mapping
-        self._int = OrderedDict()
+        self._int = dict()
+
+        # cached results of `idx2int` keyed on the tuple of idx. Cleared when `self._int` changes
+        self._idx2int_cache = dict()
+
+        # dense array mapping integer idx to int, built by `_get_int_lookup` when needed
+        self._int_lookup = None
+
+        # substitution plans of equation singletons for `_subs_all_vectorized`
+        self._subs_plan_cache = dict()
+
+        # the sequences from which the NumPy object arrays `self._{name}_fast` were made
+        self._fast_array_source = dict()
+
+        # symbols from external devices with keys of (device, var_name, int indices) and values of
+        # (external symbol array, list of symbols). Used by `get_list_of_symbols_from_ext`
+        self._ext_symbol_cache = dict()
 
         # define the parameters of the current model that are referencing the idx of other devices in tuples of
         # (device, parameter)
-        self._foreign_keys = OrderedDict()
+        self._foreign_keys = self._class_metadata('_foreign_keys', dict())
 
         # define the internal algebraic variables of the current model
-        self._algeb_int = []
+        self._algeb_int = self._class_metadata('_algeb_int', [])
 
         # define the internal algebraic variables that are also interface variables
         self._algeb_intf = []
 
         # define the external algebraic variables that are interface variables of other devices in tuples
         # (model, algeb_name)
-        self._algeb_ext = OrderedDict()
+        self._algeb_ext = self._class_metadata('_algeb_ext', dict())
 
         # computed algebraic variables using either internal or external algebs
-        self._var_int_computed = OrderedDict()
-        self._var_int_computed_symbolic_singleton = OrderedDict()
+        self._var_int_computed = dict()
+        self._var_int_computed_symbolic_singleton = dict()
 
         # internal custom computed variables
-        self._var_int_custom = OrderedDict()
+        self._var_int_custom = dict()
 
         # define the internal state variables of the current model
         self._state_int = []
@@ -96,33 +328,48 @@ class DeviceBase(object):
         #         `fkey` is the foreign key indexing into `idx` of the device
         #         `operation` is the type of math operation in ('set', 'add')
         #   and the value being the equation string
-        self._var_value_initial = OrderedDict()
-        self._var_value_initial_symbolic = OrderedDict()
-        self._var_value_initial_numeric = OrderedDict()
+        self._var_value_initial = self._class_metadata('_var_value_initial', dict())
+        self._var_value_initial_symbolic = dict()
+        self._var_value_initial_numeric = dict()
 
         # variable data during iteration
-        self._var_data = OrderedDict()
+        self._var_data = dict()
 
         # define the current status in the work flow
         self._workflow = None
 
         # equations to be added to the external algebraic equations. Must correspond to `_algeb_ext`
-        self._gcall_ext = OrderedDict()
-        self._gcall_ext_symbolic_singleton = OrderedDict()
-        self._gcall_ext_symbolic = OrderedDict()
+        self._gcall_ext = self._class_metadata('_gcall_ext', dict())
+        self._gcall_ext_symbolic_singleton = dict()
+        self._gcall_ext_symbolic = dict()
 
         # pairs of singleton variables and symbols, e.g., ('a', a)
-        self._symbol_singleton = OrderedDict()
+        self._symbol_singleton = dict()
+
+        # the `init_type` used by `init_symbols` to create the symbol singletons
+        self._symbol_init_type = None
+
+        # sympified equations created by `_compile_all_equations`
+        self._compiled_equations = None
 
         # internal gcall equations, must equal to the number of `_gcall_int`
-        self._gcall_int = OrderedDict()
-        self._gcall_int_symbolic_singleton = OrderedDict()
-        self._gcall_int_symbolic = OrderedDict()
+        self._gcall_int = self._class_metadata('_gcall_int', dict())
+        self._gcall_int_symbolic_singleton = dict()
+        self._gcall_int_symbolic = dict()
+
+        # numeric kernels of the gcall equations created by `make_gcall_numeric`, stored in a list of
+        # (dae addresses, function) for the equations and (row addresses, column addresses, function) for the
+        # nonzeros of the Jacobian
+        self._gcall_numeric = []
+        self._gy_numeric = []
+
+        # `DeviceData` with the parameter values read by the numeric kernels, created by `make_gcall_numeric`
+        self._device_data = None
 
         # internal fcall equations
-        self._fcall_int = OrderedDict()
-        self._fcall_int_symbolic_singleton = OrderedDict()
-        self._fcall_int_symbolic = OrderedDict()
+        self._fcall_int = dict()
+        self._fcall_int_symbolic_singleton = dict()
+        self._fcall_int_symbolic = dict()
 
         # special flags
         self._special_flags = {'no_algeb_ext_check': False,
@@ -131,10 +378,10 @@ class DeviceBase(object):
                                }
 
         # non-commutative var_int
-        self._var_int_non_commutative = OrderedDict()
+        self._var_int_non_commutative = dict()
 
         # dae address for variable and equations
-        self._dae_address = OrderedDict()
+        self._dae_address = dict()
 
     def meta_summary(self):
         """
@@ -146,6 +393,26 @@ class DeviceBase(object):
         """
         pass
 
+    @classmethod
+    def _class_metadata(cls, name, default):
+        """
+        Get the metadata member `name` defined as a class attribute by the device class, such as the ones of `PV`,
+        or `default` if not defined. Class attributes are shared by all instances and returned as they are;
+        they are tuples or read-only mappings so that they are not modified through an instance.
+
+        Parameters
+        ----------
+        name : str
+            Name of the metadata member, such as `_param_int` or `_gcall_int`
+        default : list or dict
+            The value for devices that define the member in `__init__`
+
+        Returns
+        -------
+        The class attribute or `default`
+        """
+        return getattr(cls, name, default)
+
     def init_symbols(self, init_type='symbol'):
         """
         Create symbol singletons in the first place for parameters and variables
@@ -163,6 +430,7 @@ class DeviceBase(object):
         None
         """
         assert init_type in ('symbol', 'array')
+        self._symbol_init_type = init_type
 
         meta_lists = ['_param_int', '_algeb_int', '_state_int', '_algeb_ext', '_param_ext']
 
@@ -180,7 +448,7 @@ class DeviceBase(object):
                     self._symbol_singleton[symbol_str] = MatrixSymbol(symbol_str, self.n, 1)
 
         for item in meta_dicts:
-            for symbol_str in self.__dict__[item].keys():
+            for symbol_str in self.__dict__[item]:
                 if symbol_str in self._symbol_singleton:
                     continue
                 if init_type == 'symbol':
@@ -189,7 +457,7 @@ class DeviceBase(object):
                     self._symbol_singleton[symbol_str] = MatrixSymbol(symbol_str, self.n, 1)
 
         for item in with_types:
-            for symbol_str in self.__dict__[item].keys():
+            for symbol_str in self.__dict__[item]:
                 if symbol_str in self._symbol_singleton:
                     continue
                 if init_type == 'symbol':
@@ -201,8 +469,12 @@ class DeviceBase(object):
                     pass
                     # self._symbol_singleton[symbol_str] = MatrixSymbol(symbol_str,)
 
-        logger.debug(f'\n--> {self.__class__.__name__}: Initialized symbols: '
-                     f'{pprint.pformat(self._symbol_singleton)}')
+        # equations are to be compiled with the new symbol singletons
+        self._compiled_equations = None
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('\n--> %s: Initialized symbols: %s', self.__class__.__name__,
+                         pprint.pformat(self._symbol_singleton))
 
     def init_data(self, subs_param_value=False):
         """
@@ -216,17 +488,21 @@ class DeviceBase(object):
 
         if self.n == 0:
             return False
-        logger.debug(f'\n--> {self.classname}: Entering _init_data() with subs_param_value={subs_param_value}')
+        logger.debug('\n--> %s: Entering _init_data() with subs_param_value=%s', self.classname, subs_param_value)
+
+        # symbol arrays are to be recreated. Substitution plans are no longer valid
+        self.invalidate_subs_cache()
+
         # all computational parameters
         param_int_computational = (set(self._param_int) - set(self._param_int_non_computational))
-        logger.debug(f'Computational parameters: {param_int_computational}')
+        logger.debug('Computational parameters: %s', param_int_computational)
 
         # create empty lists for non_computational params
         # for item in self._param_int_non_computational:
         #     self.__dict__[item] = list()
 
         for item in param_int_computational:
-            logger.debug(f'param_int_computational: {item}, ')
+            logger.debug('param_int_computational: %s, ', item)
             if subs_param_value is False:
                 param_array = self._make_n_symbols(var_name=item, n=self.n)
             else:
@@ -235,31 +511,24 @@ class DeviceBase(object):
                 else:
                     param_array = Array(self._param_data[item])
             self.__dict__[item] = param_array
-            logger.debug(f'{self.__dict__[item]}')
-
-        # create placeholders for computed internal parameters
-        for item in self._param_int_computed.keys():
-            self.__dict__[item] = self._make_n_symbols(var_name=item, n=self.n)
-            logger.debug(f'param_int_computed placeholders: {item}, {self.__dict__[item]}')
-
-        # internal variabled computed
-        for item in self._var_int_computed:
-            self.__dict__[item] = self._make_n_symbols(var_name=item, n=self.n)
-            logger.debug(f'var_int_computed placeholders: {item}, {self.__dict__[item]}')
-
-        # create placeholder in `self.__dict__` for custom computed parameters
-        for item in self._param_int_custom:
-            self.__dict__[item] = self._make_n_symbols(var_name=item, n=self.n)
-
-        # make symbols for variables with a dae address
-        for item in self.int_dae_var:
-            logger.debug(f'Creating variable symbols for {item}')
-            self.__dict__[item] = self._make_n_symbols(var_name=item, n=self.n)
+            logger.debug('%s', self.__dict__[item])
+
+        # create placeholder symbols for computed internal parameters, computed internal variables, custom
+        # computed parameters, and variables with a dae address
+        placeholders = [('param_int_computed', self._param_int_computed),
+                        ('var_int_computed', self._var_int_computed),
+                        ('param_int_custom', self._param_int_custom),
+                        ('int_dae_var', self.int_dae_var),
+                        ]
+        for collection_name, collection in placeholders:
+            for item in collection:
+                self.__dict__[item] = self._make_n_symbols(var_name=item, n=self.n)
+                logger.debug('%s placeholders: %s, %s', collection_name, item, self.__dict__[item])
 
         # TODO: consider moving outside this function
         # create empty numpy arrays for `self._var_data`
-        for item in (self._state_int + self._algeb_int):
-            logger.debug(f'Creating numpy storage for variable {item}')
+        for item in (*self._state_int, *self._algeb_int):
+            logger.debug('Creating numpy storage for variable %s', item)
             self._var_data[item] = np.zeros((self.n,))
 
     def init_equation(self):
@@ -275,14 +544,19 @@ class DeviceBase(object):
         """
         # NOTE: this function is not being used.
 
-        algeb_state_list = self._algeb_int + self._algeb_intf + self._state_int
-        if len(algeb_state_list) == 0:
+        algeb_state_list = [*self._algeb_int, *self._algeb_intf, *self._state_int]
+        if self.n == 0 or len(algeb_state_list) == 0:
             return
-        logger.debug(f'\n--> {self.__class__.__name__}: Entering _init_equation()')
+        logger.debug('\n--> %s: Entering _init_equation()', self.__class__.__name__)
 
-        for item in (self._algeb_int + self._algeb_intf + self._state_int):
+        # one contiguous residual block; each equation is a row view into it.
+        # `dict.fromkeys` drops duplicates since interface variables may also be internal ones
+        names = list(dict.fromkeys(algeb_state_list))
+        self._residuals = np.zeros((len(names), self.n), dtype=np.float64)
+
+        for i, item in enumerate(names):
             eq_name = f'_{item}'  # equation names starts with "_" and follows with the corresponding var name
-            self.__dict__[eq_name] = MutableDenseNDimArray([0] * self.n)
+            self.__dict__[eq_name] = self._residuals[i]
             logger.debug(self.__dict__[eq_name])
 
     def create_param_symbol_value_pair(self):
@@ -301,10 +575,10 @@ class DeviceBase(object):
 
         for p in param_names:
             if p not in self.__dict__:
-                logger.debug(f'Field {p} not exist in {self.__class__.__name__}, check param consistency.')
+                logger.debug('Field %s not exist in %s, check param consistency.', p, self.__class__.__name__)
                 continue
             if p not in self._param_data:
-                logger.debug(f'Param data for <{p}> does not exist in <{self.__class__.__name__}>.')
+                logger.debug('Param data for <%s> does not exist in <%s>.', p, self.__class__.__name__)
                 continue
             self._param_sym_val_pair[p] = (self.__dict__[p], self._param_data[p])
 
@@ -326,18 +600,24 @@ class DeviceBase(object):
             idx = self.n
         self._int.update({idx: self.n})
         self.idx.append(idx)
+        self._idx2int_cache.clear()
+        self._int_lookup = None
+        self._subs_plan_cache.clear()
 
         # grab default values and update with `kwargs`
-        param_vals = OrderedDict(self._param_int_default)
+        param_vals = dict(self._param_int_default)
         param_vals.update(kwargs)
 
         for man in self._param_int_mandatory:
-            if man not in param_vals.keys():
-                logger.error(f'{self.classname}: mandatory param <{man}> missing.')
+            if man not in param_vals:
+                logger.error('%s: mandatory param <%s> missing.', self.classname, man)
 
         for key, val in param_vals.items():
             if key not in self._param_data:  # TODO: check if `key` is a valid parameter
-                self._param_data[key] = []  # TODO: consider numpy array instead
+                self._param_data[key] = []
+            elif isinstance(self._param_data[key], np.ndarray):
+                # converted to arrays by `metadata_check`; collect in a list again until the next check
+                self._param_data[key] = self._param_data[key].tolist()
             self._param_data[key].append(val)
 
     def make_gcall_ext_symbolic(self):
@@ -350,13 +630,12 @@ class DeviceBase(object):
         None
         """
 
-        if len(self._gcall_ext) == 0:
+        if self.n == 0 or len(self._gcall_ext) == 0:
             return
-        logger.debug(f'\n--> {self.classname} Entering make_gcall_ext_symbolic')
-        for var, eq in self._gcall_ext.items():
-            equation_singleton = sympify(eq, locals=self._symbol_singleton)
+        logger.debug('\n--> %s Entering make_gcall_ext_symbolic', self.classname)
+        for var, equation_singleton, _, _ in self._compiled_entries('_gcall_ext'):
             self._gcall_ext_symbolic_singleton[var] = equation_singleton
-            logger.debug(f'Equation: <{eq}>, symbolic: <{equation_singleton}>')
+            logger.debug('Equation: <%s>, symbolic: <%s>', self._gcall_ext[var], equation_singleton)
 
     def make_gcall_int_symbolic(self):
         """
@@ -368,14 +647,182 @@ class DeviceBase(object):
         None
         """
 
-        if len(self._gcall_int) == 0:
+        if self.n == 0 or len(self._gcall_int) == 0:
             return
-        logger.debug(f'\n--> {self.classname} Entering make_gcall_int_symbolic')
-        for var, eq in self._gcall_int.items():
-            # convert to equation singleton
-            equation_singleton = sympify(eq, locals=self._symbol_singleton)
+        logger.debug('\n--> %s Entering make_gcall_int_symbolic', self.classname)
+        for var, equation_singleton, _, _ in self._compiled_entries('_gcall_int'):
             self._gcall_int_symbolic_singleton[var] = equation_singleton
-            logger.debug(f'Equation: <{eq}>, symbolic: <{equation_singleton}>')
+            logger.debug('Equation: <%s>, symbolic: <%s>', self._gcall_int[var], equation_singleton)
+
+    def make_gcall_numeric(self):
+        """
+        Compile the gcall equations in `_gcall_int` and `_gcall_ext` into numeric kernels. Each kernel is
+        lambdified from the equation singleton and evaluates the equation for all the elements in one call, with
+        the variables taken from the array of algebraic variables at the dae addresses and the parameters from
+        the contiguous arrays of the `DeviceData` from `make_device_data`. The kernels of the partial derivatives
+        with respect to the variables give the Jacobian. Computed parameters and vectorized computed variables
+        are expanded into the equations.
+
+        The kernels do not use the element symbols or `delayed_symbol_sub_all`, and are used by
+        `DAE.lambdify_algebs` with `backend='kernels'`.
+
+        Returns
+        -------
+        None
+        """
+        self._gcall_numeric = []
+        self._gy_numeric = []
+        if self.n == 0:
+            return
+
+        self._device_data = self.make_device_data()
+        for dict_name in ('_gcall_int', '_gcall_ext'):
+            for var, equation_singleton, _, _ in self._compiled_entries(dict_name):
+                equation = self._expand_computed(equation_singleton)
+                args = tuple(sorted(equation.free_symbols, key=str))
+                sources = [self._numeric_source(symbol, var) for symbol in args]
+
+                addr = np.asarray(self._dae_address[var], dtype=int)
+                self._gcall_numeric.append((addr, _bind_kernel(equation, args, sources, self.n)))
+
+                for symbol, (is_variable, col_addr) in zip(args, sources):
+                    derivative = equation.diff(symbol) if is_variable else S.Zero
+                    if derivative != 0:
+                        self._gy_numeric.append((addr, col_addr, _bind_kernel(derivative, args, sources, self.n)))
+
+    def _expand_computed(self, equation_singleton):
+        """
+        Expand the computed parameters in `_param_int_computed` and the vectorized computed variables in
+        `_var_int_computed` into `equation_singleton`, so that it depends only on parameters and variables.
+        Symbols are matched by name and made commutative.
+
+        Returns
+        -------
+        sympy.Basic : the expanded equation
+        """
+        computed = {var: eq for var, eq, _, _ in self._compiled_entries('_param_int_computed')}
+        computed.update({var: eq for var, eq, compute_type, return_type
+                         in self._compiled_entries('_var_int_computed')
+                         if compute_type == 'vectorized' and return_type is None})
+
+        equation = equation_singleton
+        while True:
+            rule = {symbol: Symbol(symbol.name) for symbol in equation.free_symbols if not symbol.is_commutative}
+            rule.update({symbol: computed[symbol.name] for symbol in equation.free_symbols
+                         if symbol.name in computed})
+            if not rule:
+                return equation
+            equation = equation.xreplace(rule)
+
+    def _numeric_source(self, symbol, var):
+        """
+        Get the source of `symbol` in the numeric kernel of the equation of `var`, which is `(True, addresses)` for
+        a variable with a dae address, or `(False, values)` for a parameter in `self._device_data`
+
+        Returns
+        -------
+        tuple : (is_variable, array)
+        """
+        name = symbol.name
+        if name in self._dae_address:
+            return True, np.asarray(self._dae_address[name], dtype=int)
+
+        values = getattr(self._device_data, name, None)
+        if not isinstance(values, np.ndarray):
+            raise NotImplementedError(f'{self.classname}: <{name}> in the equation of <{var}> has no dae address '
+                                      f'or numeric values for a numeric kernel')
+        return False, values
+
+    def _compile_all_equations(self):
+        """
+        Sympify the equations in `_param_int_computed`, `_var_int_computed`, `_gcall_int` and `_gcall_ext` in
+        one pass. The results are stored in `self._compiled_equations` with keys of `(dict_name, var)` and
+        values of `(equation_singleton, compute_type, return_type)`, to be shared by `compute_param_int`,
+        `compute_variable` and `make_gcall_*_symbolic`.
+
+        `_var_int_computed` supports a list of
+         - [equation]
+         - [equation, compute_type]
+         - [equation, compute_type, return_type]
+
+        Returns
+        -------
+        None
+        """
+        compiled = dict()
+
+        for var, eq in self._param_int_computed.items():
+            compiled[('_param_int_computed', var)] = (cached_sympify(eq), 'vectorized', None)
+
+        for var, eq in self._var_int_computed.items():
+            compute_type = 'vectorized'
+            return_type = None
+            if isinstance(eq, list):
+                if len(eq) == 3:
+                    eq, compute_type, return_type = eq
+                elif len(eq) == 2:
+                    eq, compute_type = eq
+                elif len(eq) == 1:
+                    eq = eq[0]
+                else:
+                    raise NotImplementedError
+            else:
+                raise NotImplementedError
+            compiled[('_var_int_computed', var)] = (non_commutative_sympify(eq), compute_type, return_type)
+
+        for dict_name in ('_gcall_int', '_gcall_ext'):
+            for var, eq in self.__dict__[dict_name].items():
+                compiled[(dict_name, var)] = (self._sympify_gcall(eq), 'vectorized', Array)
+
+        self._compiled_equations = compiled
+
+    def _compiled_entries(self, dict_name):
+        """
+        Get the compiled equations of the dictionary `dict_name`. Compile all equations first if not compiled
+        or if `dict_name` has new equations since.
+
+        Parameters
+        ----------
+        dict_name : str
+            The name of the equation dictionary in `('_param_int_computed', '_var_int_computed', '_gcall_int',
+            '_gcall_ext')`
+
+        Returns
+        -------
+        list : a list of `(var, equation_singleton, compute_type, return_type)`
+        """
+        equations = self.__dict__[dict_name]
+        if self._compiled_equations is None or \
+                any((dict_name, var) not in self._compiled_equations for var in equations):
+            self._compile_all_equations()
+
+        return [(var, *self._compiled_equations[(dict_name, var)]) for var in equations]
+
+    def _sympify_gcall(self, eq):
+        """
+        Get the equation singleton of a gcall equation, given either as an expression of symbols or as a string.
+
+        Expressions are used as they are, with their symbols replaced only by symbol singletons of the same
+        name that differ from them, such as non-commutative symbols or `MatrixSymbol`s of `init_type='array'`.
+        Strings are sympified with the symbol singletons. Only the parsed equation singleton, which is free of
+        the element symbols and parameter values, is cached, keyed on the string and the symbol singletons.
+
+        Parameters
+        ----------
+        eq : sympy.Basic or str
+            The equation
+
+        Returns
+        -------
+        sympy.Basic : the equation singleton
+        """
+        if isinstance(eq, Basic):
+            singletons = self._symbol_singleton
+            rule = {sym: singletons[sym.name] for sym in eq.free_symbols
+                    if sym.name in singletons and singletons[sym.name] != sym}
+            return eq.xreplace(rule) if rule else eq
+
+        return cached_sympify(eq, locals=self._symbol_singleton)
 
     def delayed_symbol_sub_all(self, subs_param_value=False):
         """
@@ -387,10 +834,13 @@ class DeviceBase(object):
         None
 
         """
+        if self.n == 0:
+            return
+
         for key, val in self._param_int_custom.items():
             equation = self.__dict__[key]
             self._param_int_custom_symbolic[key] = equation
-            self.__dict__[key] = self._subs_all_singleton(equation, subs_param_value=subs_param_value)
+            self.__dict__[key] = self.subs_param_custom(key, subs_param_value=subs_param_value)
 
         self.compute_variable(operation='subs', subs_param_value=True)
         self.delayed_symbol_sub(in_dict_name='_gcall_ext_symbolic_singleton', out_dict_name='_gcall_ext_symbolic',
@@ -427,70 +877,71 @@ class DeviceBase(object):
         None
         """
         assert subs_type in ('vectorized', 'singleton')
+        if self.n == 0:
+            return
 
         singleton_dict = self.__dict__[in_dict_name]
+        out_dict = self.__dict__[out_dict_name]
+        if subs_type == 'vectorized':
+            subs_func = self._subs_all_vectorized
+        else:
+            subs_func = self._subs_all_singleton
+
         for var, eq in singleton_dict.items():
-            if not update and var in self.__dict__[out_dict_name]:
+            if not update and var in out_dict:
                 continue
-
-            if subs_type == 'vectorized':
-                out = self._subs_all_vectorized(eq, subs_param_value=subs_param_value, return_as=output_type)
-                self.__dict__[out_dict_name][var] = out
-            elif subs_type == 'singleton':
-                out = self._subs_all_singleton(eq, subs_param_value=subs_param_value, return_as=output_type)
-                self.__dict__[out_dict_name][var] = out
+            out_dict[var] = subs_func(eq, subs_param_value=subs_param_value, return_as=output_type)
 
     def _subs_all_vectorized(self, equation_singleton, subs_param_value=False, return_as=list):
         """Substitute symbol singletons with element-wise variable names for the provided expression"""
 
-        logger.debug(f'{self.classname}: Equation <{equation_singleton}> vectorized substitution:')
+        logger.debug('%s: Equation <%s> vectorized substitution:', self.classname, equation_singleton)
 
-        free_syms = equation_singleton.free_symbols
+        plan = self._get_subs_plan(equation_singleton, subs_param_value=subs_param_value)
 
         # skip substitution if the `equation_singleton` contains no `free_symbols`. This happens if equation
         # singleton is a pure numerical value
 
-        if len(free_syms) == 0:
+        if len(plan) == 0:
             ret = [equation_singleton] * self.n
         else:
-            lens = [len(self.__dict__[str(x)]) for x in free_syms]
-
-            n_element = min(lens)
-
-            ret = [0] * n_element
-            for i in range(n_element):
-
-                sym_list = []
-                for symbol in free_syms:
-                    sym = str(symbol)
-
-                    value_exist = True
-                    substitute = None
-                    if subs_param_value is True:
-                        # param value does not exist. Fall back to symbols
-                        if sym not in self.parameters:
-                            value_exist = False
-                        if (sym not in self._param_data) or len(self._param_data[sym]) == 0:
-                            logger.debug(f'{self.__class__.__name__}: Param data <{sym}> not exist. '
-                                         f'Using symbols.')
-                            value_exist = False
-                        else:
-                            substitute = self._param_data[sym][i]
-
-                    if (subs_param_value is False) or (value_exist is False):
-                        if hasattr(self.__dict__[sym], '__len__') and (len(self.__dict__[sym]) == 0):
-                            logger.debug(f'{self.__class__.__name__}: symbol <{sym}> not properly initialized.')
-                            raise ValueError
-                        else:
-                            substitute = self.__dict__[sym][i]
-
-                    sym_list.append((symbol, substitute))
-
+            n_element, symbols_and_arrays = self._get_subs_arrays(plan)
+
+            columns = []
+            for _, array in symbols_and_arrays:
+                column = _numeric_column(array, n_element)
+                if column is None:
+                    break
+                columns.append(column)
+
+            all_numeric = n_element > 0 and len(columns) == len(symbols_and_arrays)
+            if not all_numeric:
+                sym_lists = [[(symbol, array[i]) for symbol, array in symbols_and_arrays]
+                             for i in range(n_element)]
+
+            if all_numeric:
+                # all substitutes are numbers: evaluate the lambdified equation once for all the elements
+                args = tuple(symbol for symbol, _ in symbols_and_arrays)
+                func = _cached_lambdify(args, equation_singleton)
+                ret = np.broadcast_to(func(*columns), (n_element, )).tolist()
+            elif n_element > 0 and subs_param_value and equation_singleton.is_commutative and \
+                    all(_is_numeric(val) or (isinstance(val, Basic) and val.is_commutative)
+                        for _, val in sym_lists[0]):
+                # numeric parameters with symbolic variables
+                ret = self._subs_param_linear(equation_singleton, symbols_and_arrays, sym_lists)
+                if ret is None:
+                    # bind the values by calling the equation lambdified with sympy functions instead of
+                    # rewriting the expression tree per element
+                    args = tuple(sym for sym, _ in sym_lists[0])
+                    func = _cached_lambdify(args, equation_singleton, modules='sympy')
+                    ret = [sympify(func(*(sympify(val) for _, val in sym_list))) for sym_list in sym_lists]
+            else:
                 # TODO:
                 #  Issue with Sympy: the `subs` below will convert the new substitute to the type of the old one
                 #  E.g., if we are substuting Bus_v_0 (symbol) for v (MatrixSymbol), then Bus_v_0 will be converted
                 #  to a MatrixSymbol, which cannot be added to the DAE
-                ret[i] = equation_singleton.subs(sym_list)
+                ret = [_cached_subs(equation_singleton, sym_list, xreplace=True)
+                       for sym_list in sym_lists]
 
         # process return type
         if return_as is None:
@@ -500,9 +951,189 @@ class DeviceBase(object):
         else:
             ret = return_as(ret)
 
-        logger.debug(pprint.pformat(ret))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(pprint.pformat(ret))
+        return ret
+
+    def _get_subs_arrays(self, plan):
+        """
+        Get the substitutes of a substitution plan from `_get_subs_plan`
+
+        Returns
+        -------
+        tuple : the number of elements and a list of `(symbol, array of substitutes)`
+        """
+        attrs = self.__dict__
+        arrays = {sym: attrs[sym] for _, sym, _ in plan}
+        n_element = min(len(array) for array in arrays.values())
+
+        symbols_and_arrays = []
+        if n_element > 0:
+            param_data = self._param_data
+            for symbol, sym, use_param_data in plan:
+                if use_param_data:
+                    symbols_and_arrays.append((symbol, param_data[sym]))
+                    continue
+
+                if hasattr(arrays[sym], '__len__') and (len(arrays[sym]) == 0):
+                    logger.debug('%s: symbol <%s> not properly initialized.', self.__class__.__name__, sym)
+                    raise ValueError
+                symbols_and_arrays.append((symbol, self._get_fast_array(sym)))
+        return n_element, symbols_and_arrays
+
+    def _subs_all_fused(self, equations, subs_param_value=False):
+        """
+        Substitute the element symbols, or the parameter values, into a list of commutative equation singletons
+        in one pass over the elements. The equations are lambdified into one function returning all of them, with
+        the common subexpressions evaluated once. The function is called once for all the elements if all the
+        substitutes are numbers, or once per element with the sympy substitutes otherwise.
+
+        Parameters
+        ----------
+        equations : list
+            A list of commutative equation singletons
+        subs_param_value : bool
+            Substitute parameters with values if available
+
+        Returns
+        -------
+        list : a list of the values of the elements for each equation
+        """
+        equation = Tuple(*equations)
+        plan = self._get_subs_plan(equation, subs_param_value=subs_param_value)
+        if len(plan) == 0:
+            return [[eq] * self.n for eq in equations]
+
+        n_element, symbols_and_arrays = self._get_subs_arrays(plan)
+        args = tuple(symbol for symbol, _ in symbols_and_arrays)
+
+        columns = [_numeric_column(array, n_element) for _, array in symbols_and_arrays]
+        if n_element > 0 and all(column is not None for column in columns):
+            values = _cached_lambdify(args, equation)(*columns)
+            return [np.broadcast_to(value, (n_element, )).tolist() for value in values]
+
+        sym_lists = [[sympify(array[i]) for _, array in symbols_and_arrays] for i in range(n_element)]
+        if all(isinstance(val, Basic) and val.is_commutative and not isinstance(val, MatrixBase)
+               for sym_list in sym_lists for val in sym_list):
+            func = _cached_lambdify(args, equation, modules='sympy')
+            rows = [func(*sym_list) for sym_list in sym_lists]
+        else:
+            rows = [_cached_subs(equation, list(zip(args, sym_list)), xreplace=True) for sym_list in sym_lists]
+        return [[sympify(row[k]) for row in rows] for k in range(len(equations))]
+
+    def _subs_param_linear(self, equation_singleton, symbols_and_arrays, sym_lists):
+        """
+        Substitute an equation that sums terms of parameters times variables, such as `v - v0 + 1e-5 * q` of
+        `PV`. The coefficients, which depend on the parameters only, are evaluated for all the elements at once
+        with NumPy, and only the variable factors are substituted per element.
+
+        Only used if the parameters are float or complex arrays, so that the numeric coefficients equal the
+        ones from symbolic substitution. Integer parameters, such as the `v0 = 1` of the bundled examples, are
+        substituted by `_subs_all_vectorized` instead.
+
+        Parameters
+        ----------
+        equation_singleton : sympy.Basic
+            The commutative equation singleton
+        symbols_and_arrays : list
+            A list of (symbol, array of substitutes)
+        sym_lists : list
+            The per-element lists of (symbol, substitute)
+
+        Returns
+        -------
+        list or None : the substituted equations, or None if the equation cannot be split
+        """
+        n_element = len(sym_lists)
+        params = [(symbol, array) for symbol, array in symbols_and_arrays
+                  if isinstance(array, np.ndarray) and array.dtype.kind in 'fc']
+        if not isinstance(equation_singleton, Add) or len(params) == 0:
+            return None
+
+        param_symbols = set(symbol for symbol, _ in params)
+        variables = tuple(symbol for symbol, _ in symbols_and_arrays if symbol not in param_symbols)
+        const, terms = _split_param_linear(equation_singleton, variables)
+
+        def evaluate(coeff):
+            # numeric coefficients for all the elements, or the sympy constant if free of parameters
+            if not (coeff.free_symbols & param_symbols):
+                return [coeff] * n_element
+            args = tuple(symbol for symbol, _ in params if symbol in coeff.free_symbols)
+            columns = [array[:n_element] for symbol, array in params if symbol in coeff.free_symbols]
+            values = np.broadcast_to(_cached_lambdify(args, coeff)(*columns), (n_element, ))
+            return [sympify(val) for val in values.tolist()]
+
+        const_values = evaluate(const)
+        coeff_values = [evaluate(coeff) for coeff, _ in terms]
+
+        ret = []
+        for i, sym_list in enumerate(sym_lists):
+            rule = {symbol: sympify(val) for symbol, val in sym_list if symbol not in param_symbols}
+            ret.append(Add(const_values[i], *(values[i] * factor.xreplace(rule)
+                                              for values, (_, factor) in zip(coeff_values, terms))))
         return ret
 
+    def _get_fast_array(self, name):
+        """
+        Get a flat NumPy object array of the elements in `self.{name}` for fast element access. The array is
+        stored as `self._{name}_fast` and is rebuilt if `self.{name}` has been replaced since.
+
+        Parameters
+        ----------
+        name : str
+            Name of the symbol array, such as a parameter or variable name
+
+        Returns
+        -------
+        np.ndarray : an object array of the elements
+        """
+        array = self.__dict__[name]
+        if self._fast_array_source.get(name) is not array:
+            fast = np.empty((len(array), ), dtype=object)
+            for i, item in enumerate(array):
+                fast[i] = item
+            self.__dict__[f'_{name}_fast'] = fast
+            self._fast_array_source[name] = array
+        return self.__dict__[f'_{name}_fast']
+
+    def _get_subs_plan(self, equation_singleton, subs_param_value=False):
+        """
+        Get the substitution plan of an equation singleton for `_subs_all_vectorized`, which is a list of
+        `(symbol, symbol_name, use_param_data)` for its free symbols. If `use_param_data` is True, the symbol is
+        substituted with the parameter values in `self._param_data`; otherwise, with the element symbols in
+        `self.__dict__`. Plans are cached in `self._subs_plan_cache`.
+
+        Parameters
+        ----------
+        equation_singleton : sympy.Basic
+            The equation singleton
+        subs_param_value : bool
+            Substitute parameters with values if available
+
+        Returns
+        -------
+        list : the substitution plan
+        """
+        key = (equation_singleton, subs_param_value)
+        if key in self._subs_plan_cache:
+            return self._subs_plan_cache[key]
+
+        plan = []
+        parameters = self.parameters
+        for symbol in equation_singleton.free_symbols:
+            sym = str(symbol)
+            use_param_data = False
+            if subs_param_value is True:
+                if (sym not in self._param_data) or len(self._param_data[sym]) == 0:
+                    # param value does not exist. Fall back to symbols
+                    logger.debug('%s: Param data <%s> not exist. Using symbols.', self.__class__.__name__, sym)
+                elif sym in parameters:
+                    use_param_data = True
+            plan.append((symbol, sym, use_param_data))
+
+        self._subs_plan_cache[key] = plan
+        return plan
+
     def _subs_all_singleton(self, equation_singleton, subs_param_value=False, return_as=None):
         """Substitute symbol singletons with symbols expression"""
 
@@ -523,14 +1154,16 @@ class DeviceBase(object):
                         idx_int = int(idx_int)
                         sym_list.append((symbol, self.system.__dict__[dev_name]._param_data[var_name][idx_int]))
                     else:
-                        logger.debug(f'Param data for <{sym}> does not exist. Fall back to symbolic subs.')
+                        logger.debug('Param data for <%s> does not exist. Fall back to symbolic subs.', sym)
                         sym_list.append((symbol, self.__dict__[sym]))
                 else:
                     sym_list.append((symbol, self._param_data[sym]))  # TODO: substituting with a numpy array may
                 # cause issue
 
-        # use `simultaneous` subs for matrix substitution
-        ret = equation_singleton.subs(sym_list, simultaneous=True)
+        # `xreplace` is equivalent to the `simultaneous` subs for matrix substitution when all the substitutes
+        # are sympy objects or numbers. Other substitutes, such as lists of parameter values, fall back to `subs`
+        use_xreplace = all(isinstance(val, (Basic, MatrixBase)) or _is_numeric(val) for _, val in sym_list)
+        ret = _cached_subs(equation_singleton, sym_list, simultaneous=True, xreplace=use_xreplace)
 
         # process return type
         if return_as is None:
@@ -539,6 +1172,17 @@ class DeviceBase(object):
             ret = return_as(ret)
         return ret
 
+    def invalidate_subs_cache(self):
+        """
+        Clear the substitution plans of this device. To be called when the symbol arrays or parameters change.
+        The process-wide substitution results are keyed on the substitutes and are not affected.
+
+        Returns
+        -------
+        None
+        """
+        self._subs_plan_cache.clear()
+
     def _make_n_symbols(self, var_name, n, commutative=True, return_as=Array):
         """
         Make an array of n consecutive symbols for the given variable name. The return symbols has the format
@@ -559,8 +1203,9 @@ class DeviceBase(object):
         -------
         A array of symbols
         """
-        symbol_range_str = f'{self.classname}_{var_name}_0:{n}'
-        return return_as(symbols(symbol_range_str, commutative=commutative))
+        # construct the symbols directly instead of parsing the range string `classname_varname_0:n`
+        prefix = f'{self.classname}_{var_name}_'
+        return return_as([Symbol(f'{prefix}{i}', commutative=commutative) for i in range(n)])
 
     @property
     def int_dae_var(self):
@@ -571,7 +1216,7 @@ class DeviceBase(object):
         -------
         list : a list of the variable names that are registered in the dae
         """
-        return self._algeb_int + self._state_int
+        return [*self._algeb_int, *self._state_int]
 
     @property
     def n(self):
@@ -594,7 +1239,7 @@ class DeviceBase(object):
         """Return all parameters"""
         out = []
         out += self._param_int
-        out += list(self._param_int_computed.keys())
+        out += list(self._param_int_computed)
         out += list(self._param_int_custom)
         out += list(self._param_ext)
         out += list(self._param_ext_computed)
@@ -612,9 +1257,9 @@ class DeviceBase(object):
         -------
         None
         """
-        if len(self._algeb_ext) == 0:
+        if self.n == 0 or len(self._algeb_ext) == 0:
             return
-        logger.debug(f'\n--> {self.__class__.__name__}: Entering get_algeb_ext()')
+        logger.debug('\n--> %s: Entering get_algeb_ext()', self.__class__.__name__)
 
         for dest, (fkey, var_name) in self._algeb_ext.items():
 
@@ -660,8 +1305,9 @@ class DeviceBase(object):
 
         fkey_values = self._param_data[fkey]
         # the values of `fkey` is stored in `self._param_data` instead of self.__dict__
+        dev_ref = self.system.__dict__[dev.lower()]
 
-        return self.system.__dict__[dev.lower()].idx2int(fkey_values)
+        return dev_ref.idx2int(fkey_values)
 
     def get_list_of_symbols_from_ext(self, dev, var_name, int_idx):
         """
@@ -685,17 +1331,102 @@ class DeviceBase(object):
         dev = dev.lower()
         if isinstance(int_idx, np.ndarray):
             int_idx = int_idx.tolist()  # sympy is not aware of numpy.int64; convert to a list of floats
-        return [self.system.__dict__[dev].__dict__[var_name][i] for i in int_idx]
+
+        # cached lists are valid as long as the external symbol array has not been replaced
+        ext_array = self.system.__dict__[dev].__dict__[var_name]
+        key = (dev, var_name, tuple(int_idx))
+        if key in self._ext_symbol_cache:
+            source, ret = self._ext_symbol_cache[key]
+            if source is ext_array:
+                return list(ret)
+
+        dev_ref = self.system.__dict__[dev]
+        if isinstance(dev_ref, DeviceBase) and hasattr(ext_array, '__len__'):
+            # gather from the NumPy object array companion
+            ret = dev_ref._get_fast_array(var_name)[np.asarray(int_idx, dtype=np.intp)].tolist()
+        else:
+            ret = [ext_array[i] for i in int_idx]
+        self._ext_symbol_cache[key] = (ext_array, ret)
+        return list(ret)
 
     def idx2int(self, idx):
         """
-        Convert external indices `idx` to internal indices as stored in `self.int`
+        Convert external indices `idx` to internal indices as stored in `self.int`. Lookups are cached by
+        `idx`, and each call returns a new array that the caller may modify.
 
         Returns
         -------
         np.ndarray : an array of internal indices
         """
-        return np.array([self._int[i] for i in idx])
+        key = tuple(idx)
+        if key not in self._idx2int_cache:
+            ret = None
+
+            lookup = self._get_int_lookup()
+            idx_array = np.asarray(key)
+            if lookup is not None and idx_array.dtype.kind in 'iu':
+                if np.all((idx_array >= 0) & (idx_array < len(lookup))):
+                    ret = lookup[idx_array]
+                    if np.any(ret < 0):  # `idx` not found. Let the dict lookup raise the KeyError
+                        ret = None
+
+            if ret is None:
+                ret = np.array([self._int[i] for i in key])
+
+            self._idx2int_cache[key] = ret
+        return self._idx2int_cache[key].copy()
+
+    def _get_int_lookup(self):
+        """
+        Get a dense array `lookup` such that `lookup[idx] = int` for non-negative integer `idx`, and -1 for
+        unused `idx`. The array is not created for non-integer `idx` or for sparse `idx` that would make a
+        much larger array than `self._int`.
+
+        Returns
+        -------
+        np.ndarray or None : the lookup array, or None if not applicable
+        """
+        if self._int_lookup is None and len(self._int) > 0:
+            keys = list(self._int)
+            if all(isinstance(i, (int, np.integer)) and not isinstance(i, bool) for i in keys):
+                max_idx = max(keys)
+                if min(keys) >= 0 and max_idx < 4 * len(keys) + 1024:
+                    lookup = np.full((max_idx + 1, ), -1, dtype=np.intp)
+                    lookup[keys] = list(self._int.values())
+                    self._int_lookup = lookup
+
+        return self._int_lookup
+
+    def model_repr(self):
+        """
+        Get a string of the model definition and the parameter data of this device, which determine the equations
+        built by the symbolic stages. The equations are printed with `srepr`, and the parameters with all their
+        digits. Available right after `metadata_check`.
+
+        Returns
+        -------
+        str : the string of the model
+        """
+        metadata = {name: dict(self.__dict__[name]) if isinstance(self.__dict__[name], Mapping)
+                    else list(self.__dict__[name]) for name in _MODEL_METADATA}
+        data = {key: val.tolist() if isinstance(val, np.ndarray) else list(val)
+                for key, val in self._param_data.items()}
+        return srepr([self.classname, self.n, list(self.idx), metadata, data])
+
+    def make_device_data(self):
+        """
+        Create a `DeviceData` holding the values of computational parameters for all elements
+
+        Returns
+        -------
+        DeviceData : the device data
+        """
+        params = [p for p in self._param_int if p not in self._param_int_non_computational]
+        data = DeviceData(self.classname, params, n_element=self.n)
+        for p in params:
+            if p in self._param_data:
+                data.__dict__[p][:] = self._param_data[p]
+        return data
 
     def add_element_with_defaults(self, n: int):
         """
@@ -714,6 +1445,9 @@ class DeviceBase(object):
         assert n >= 0
         self.idx = list(range(n))
         self._int = {i: i for i in self.idx}
+        self._idx2int_cache.clear()
+        self._int_lookup = np.arange(n, dtype=np.intp)
+        self._subs_plan_cache.clear()
 
         for p in self._param_int:
             if p in self._param_int_mandatory:
@@ -728,7 +1462,26 @@ class DeviceBase(object):
         -------
         None
         """
+        if self.n == 0:
+            return
         self._check_number_of_algeb_equations()
+        self._make_param_arrays()
+
+    def _make_param_arrays(self):
+        """
+        Convert the parameter lists in `self._param_data` to NumPy arrays, one contiguous array per parameter.
+        Parameters with non-numeric values, such as names, are kept as lists.
+
+        Returns
+        -------
+        None
+        """
+        for key, values in self._param_data.items():
+            if isinstance(values, np.ndarray):
+                continue
+            array = np.asarray(values)
+            if array.dtype.kind in 'biufc':
+                self._param_data[key] = array
 
     def _check_number_of_algeb_equations(self):
         """
@@ -754,15 +1507,15 @@ class DeviceBase(object):
         """
         # process internally computed parameters
 
-        if len(self._param_int_computed) == 0:
+        if self.n == 0 or len(self._param_int_computed) == 0:
             return
-        logger.debug(f'\n--> {self.__class__.__name__}: Entering compute_param_int():')
-        for var, eq in self._param_int_computed.items():
-            equation_singleton = sympify(eq)
+        logger.debug('\n--> %s: Entering compute_param_int():', self.__class__.__name__)
+        for var, equation_singleton, _, _ in self._compiled_entries('_param_int_computed'):
             self.__dict__[var] = self._subs_all_vectorized(equation_singleton, subs_param_value=subs_param_value)
-            logger.debug(f'variable <{var}>, equation <{eq}>: \n {self.__dict__[var]}')
+            logger.debug('variable <%s>, equation <%s>: \n %s',
+                         var, self._param_int_computed[var], self.__dict__[var])
 
-    def compute_variable(self, operation='sympify', subs_param_value=False):
+    def compute_variable(self, operation='sympify', subs_param_value=False, variables=None):
         """
         Compute internal variable symbols as defined in `self._var_int_computed`. Supports a list of
          - [equation]
@@ -773,6 +1526,8 @@ class DeviceBase(object):
         ----------
         operation : str
             The type of operation in (`sympify`, `subs` or `both`)
+        variables : list, optional
+            Names of the variables to compute. Defaults to all the variables in `self._var_int_computed`
 
         Returns
         -------
@@ -781,31 +1536,16 @@ class DeviceBase(object):
         """
         assert operation in ('sympify', 'subs', 'both')
 
-        if len(self._var_int_computed) == 0:
+        if self.n == 0 or len(self._var_int_computed) == 0:
             return
 
-        logger.debug(f'\n--> {self.__class__.__name__}: Entering _compute_variable(): ')
-        for var, eq in self._var_int_computed.items():
-            compute_type = 'vectorized'
-            return_type = None
-            if isinstance(eq, list):
-                if len(eq) == 3:
-                    eq, compute_type, return_type = eq
-                elif len(eq) == 2:
-                    eq, compute_type = eq
-                elif len(eq) == 1:
-                    eq = eq[0]
-                else:
-                    raise NotImplementedError
-            else:
-                raise NotImplementedError
-
-            # sympify part
-            equation_singleton = non_commutative_sympify(eq)
+        logger.debug('\n--> %s: Entering _compute_variable(): ', self.__class__.__name__)
+        for var, equation_singleton, compute_type, return_type in self._compiled_entries('_var_int_computed'):
+            if variables is not None and var not in variables:
+                continue
             self._var_int_computed_symbolic_singleton[var] = equation_singleton
 
             # process compute_type
-            equation_singleton = self._var_int_computed_symbolic_singleton[var]
             if compute_type == 'vectorized':
                 self.__dict__[var] = self._subs_all_vectorized(equation_singleton,
                                                                subs_param_value=subs_param_value,
@@ -819,6 +1559,75 @@ class DeviceBase(object):
             if return_type is not None:
                 self.__dict__[var] = return_type(self.__dict__[var])
 
+    def compute_all(self, subs_param_value=False):
+        """
+        Compute the internal parameters, the custom parameters and the internal variables of this device, with
+        the results of `compute_param_int`, `compute_param_custom` and `compute_variable`.
+
+        The computed parameters and the vectorized computed variables that depend on neither the custom
+        parameters nor the other computed variables are fused into one function by `_subs_all_fused`, with the
+        computed parameters expanded into the equations that use them. The results are substituted in one pass
+        over the elements instead of one pass per equation. The custom parameters and the remaining variables
+        are computed afterwards.
+
+        Returns
+        -------
+        None
+        """
+        if self.n == 0:
+            return
+
+        fused = self._get_fused_entries()
+        if len(fused) > 0:
+            logger.debug('\n--> %s: Entering compute_all(): fused %s', self.__class__.__name__,
+                         [var for _, var, _, _ in fused])
+            columns = self._subs_all_fused([equation for _, _, _, equation in fused],
+                                           subs_param_value=subs_param_value)
+            for (dict_name, var, equation_singleton, _), column in zip(fused, columns):
+                if dict_name == '_var_int_computed':
+                    self._var_int_computed_symbolic_singleton[var] = equation_singleton
+                    column = Array(column)
+                self.__dict__[var] = column
+
+        self.compute_param_custom()
+        fused_variables = {var for dict_name, var, _, _ in fused if dict_name == '_var_int_computed'}
+        self.compute_variable(subs_param_value=subs_param_value,
+                              variables=[var for var in self._var_int_computed if var not in fused_variables])
+
+    def _get_fused_entries(self):
+        """
+        Get the equations fused by `compute_all`, which are all the computed parameters and the vectorized
+        computed variables without a return type whose symbols are parameters, computed parameters or variables.
+        The symbols are made commutative, and the computed parameters are expanded.
+
+        Returns
+        -------
+        list : a list of `(dict_name, var, equation_singleton, expanded equation)`
+        """
+        expanded = dict()
+        fused = []
+        for var, equation_singleton, _, _ in self._compiled_entries('_param_int_computed'):
+            expanded[var] = self._expand_fused(equation_singleton, expanded)
+            fused.append(('_param_int_computed', var, equation_singleton, expanded[var]))
+
+        variables = set(self._var_int_computed) | set(self._param_int_custom) | set(self._var_int_custom)
+        for var, equation_singleton, compute_type, return_type in self._compiled_entries('_var_int_computed'):
+            if compute_type != 'vectorized' or return_type is not None or \
+                    any(symbol.name in variables for symbol in equation_singleton.free_symbols) or \
+                    not isinstance(equation_singleton, Basic) or equation_singleton.has(MatrixSymbol):
+                continue
+            fused.append(('_var_int_computed', var, equation_singleton,
+                          self._expand_fused(equation_singleton, expanded)))
+        return fused
+
+    @staticmethod
+    def _expand_fused(equation_singleton, expanded):
+        """Make the symbols of `equation_singleton` commutative and expand the computed parameters in `expanded`"""
+        rule = {symbol: expanded.get(symbol.name, Symbol(symbol.name))
+                for symbol in equation_singleton.free_symbols
+                if symbol.name in expanded or not symbol.is_commutative}
+        return equation_singleton.xreplace(rule)
+
     def compute_variable_custom(self):
         """
         Hook functions to compute custom variables. To be overloaded by devices.
@@ -847,6 +1656,17 @@ class DeviceBase(object):
         """
         pass
 
+    def subs_param_custom(self, name, subs_param_value=False):
+        """
+        Substitute the symbols in the custom parameter `name` computed by `compute_param_custom`. Devices with
+        a numeric form of the custom parameter may overload this function.
+
+        Returns
+        -------
+        The custom parameter with symbols substituted
+        """
+        return self._subs_all_singleton(self.__dict__[name], subs_param_value=subs_param_value)
+
     def get_var_address(self):
         """
         Request address for variables in global DAE. Stored in `self._dae_address` with the variable name as
@@ -856,6 +1676,8 @@ class DeviceBase(object):
         -------
         None
         """
+        if self.n == 0:
+            return
 
         # state variables
         ret = self.system.dae.new_idx(device=self, var_type='x', var_name=self._state_int,
@@ -920,9 +1742,12 @@ class DeviceBase(object):
         -------
         None
         """
+        if self.n == 0:
+            return
+
         for keys, eq in self._var_value_initial.items():
             dev, var_name, fkey, operation = keys
-            equation_singleton = sympify(eq)
+            equation_singleton = cached_sympify(eq)
             equation_vec = self._subs_all_vectorized(equation_singleton, subs_param_value=subs_param_value,
                                                      return_as=list)
 
@@ -932,26 +1757,57 @@ class DeviceBase(object):
             if dev == 'self':
                 dev = self.classname
             if fkey == 'idx':
-                element_int = list(self._int.keys())
+                element_int = list(self._int)
             else:
                 element_int = self._get_int_of_element(dev=dev, fkey=fkey)
 
             dev_ref = self.system.__dict__[dev.lower()]
             if operation == 'set':
                 dev_ref._var_data[var_name][element_int] = equation_vec
-                logger.debug(f'Set initial value for {dev}.{var_name}{element_int} = {equation_vec}')
+                logger.debug('Set initial value for %s.%s%s = %s', dev, var_name, element_int, equation_vec)
             elif operation == 'add':
                 dev_ref._var_data[var_name][element_int] = dev_ref._var_data[var_name][element_int] + equation_vec
-                logger.debug(f'Added initial value for {dev}.{var_name}{element_int} += {equation_vec}')
+                logger.debug('Added initial value for %s.%s%s += %s', dev, var_name, element_int, equation_vec)
 
 
 class DeviceData(object):
-    """Class for storing device data"""
+    """
+    Class for storing device data
+
+    The parameters are stored in a structure of arrays. All the arrays are contiguous slices of one buffer
+    `self._buf`, laid out one parameter after another in the order of `param`.
+    """
 
-    def __init__(self, device: str, param: list, n_element=0):
+    def __init__(self, device: str, param: list, n_element=0, dtype_map=None):
+        """
+        Parameters
+        ----------
+        device : str
+            Name of the device to which the data belongs
+        param : list
+            A list of parameter names
+        n_element : int
+            The number of elements
+        dtype_map : dict
+            NumPy dtypes of the parameters, such as `{'Sn': np.float32}`. Defaults to `np.float64`
+        """
         self.device = device  # name of the device to which the data belongs
-        for item in param:
-            self.__dict__[item] = np.ndarray((n_element,))
+        if dtype_map is None:
+            dtype_map = dict()
+
+        dtypes = [(item, np.dtype(dtype_map.get(item, np.float64))) for item in param]
+
+        # byte offset of each parameter in the buffer, aligned to its dtype
+        offsets = []
+        nbytes = 0
+        for item, dtype in dtypes:
+            nbytes = -(-nbytes // dtype.alignment) * dtype.alignment
+            offsets.append(nbytes)
+            nbytes += dtype.itemsize * n_element
+
+        self._buf = np.zeros((nbytes, ), dtype=np.uint8)
+        for (item, dtype), offset in zip(dtypes, offsets):
+            self.__dict__[item] = self._buf[offset:offset + dtype.itemsize * n_element].view(dtype)
 
     def load_param_by_row(self, **kwargs):
         """
@@ -1,9 +1,14 @@
 from .devicebase import DeviceBase
+import numpy as np
 import sympy as smp
+from scipy.sparse import coo_matrix
 import logging
 
 logger = logging.getLogger(__name__)
 
+# symbols of the equations, equal to the symbol singletons of the same names created by `init_symbols`
+Pd, Qd = smp.symbols('Pd Qd')
+
 
 class Line(DeviceBase):
     """Class for ac transmission lines
@@ -66,43 +71,124 @@ class Line(DeviceBase):
                                          })
         self._param_int_custom.update({'Y': 'Matrix'})
 
-        self._gcall_ext.update({'a': 'Pd',
-                                'v': 'Qd',
+        self._gcall_ext.update({'a': Pd,
+                                'v': Qd,
                                 })
 
+        # numeric bus admittance matrix created by `make_ybus_numeric`
+        self.Ybus = None
+
     def compute_param_custom(self):
         """Compute `self.Y` for lines"""
         # Note: this one assumes `self.a1_int` is the indices of `self.a1` in `bus.a`
 
-        dok_y = dict()
-        a1_addr = self._dae_address['a1']
-        a2_addr = self._dae_address['a2']
+        a1_addr = np.asarray(self._dae_address['a1'], dtype=int)
+        a2_addr = np.asarray(self._dae_address['a2'], dtype=int)
 
         # pylint: disable=maybe-no-member
-        for a1, y1, m2, y12 in zip(a1_addr, self.y1, self.m2, self.y12):
-            # Need to check if key exist. Otherwise, same multiple `a1` will overwrite the value
-            if (a1, a1) not in dok_y.keys():
-                dok_y[(a1, a1)] = (y1 + y12) / m2
-            else:
-                dok_y[(a1, a1)] = dok_y[(a1, a1)] + ((y1 + y12) / m2)
-
-        for a1, a2, y12, mconj in zip(a1_addr, a2_addr, self.y12, self.mconj):
-            if (a1, a2) not in dok_y.keys():
-                dok_y[(a1, a2)] = -y12 / mconj
-            else:
-                dok_y[(a1, a2)] = dok_y[(a1, a2)] - y12 / mconj
-        for a1, a2, y12, m in zip(a1_addr, a2_addr, self.y12, self.m):
-            if (a2, a1) not in dok_y.keys():
-                dok_y[(a2, a1)] = - y12 / m
-            else:
-                dok_y[(a2, a1)] = dok_y[(a2, a1)] - y12 / m
-        for a2, y12, y2 in zip(a2_addr, self.y12, self.y2):
-            if (a2, a2) not in dok_y.keys():
-                dok_y[(a2, a2)] = y12 + y2
-            else:
-                dok_y[(a2, a2)] = dok_y[(a2, a2)] + (y12 + y2)
+        y1 = np.array(list(self.y1), dtype=object)
+        y2 = np.array(list(self.y2), dtype=object)
+        y12 = np.array(list(self.y12), dtype=object)
+        m = np.array(list(self.m), dtype=object)
+        m2 = np.array(list(self.m2), dtype=object)
+        mconj = np.array(list(self.mconj), dtype=object)
 
         nbus = self.system.bus.n
 
-        self.Y = smp.SparseMatrix(nbus, nbus, dok_y)
-        self.Y = smp.Matrix(self.Y)
+        # `np.add.at` accumulates the admittances of parallel lines connected to the same buses
+        Y = np.full((nbus, nbus), smp.S.Zero, dtype=object)
+        np.add.at(Y, (a1_addr, a1_addr), (y1 + y12) / m2)
+        np.add.at(Y, (a1_addr, a2_addr), -y12 / mconj)
+        np.add.at(Y, (a2_addr, a1_addr), -y12 / m)
+        np.add.at(Y, (a2_addr, a2_addr), y12 + y2)
+
+        self.Y = smp.Matrix(Y)
+
+    def subs_param_custom(self, name, subs_param_value=False):
+        """
+        Substitute `self.Y`. With parameter values, the nonzeros of the numeric complex `Ybus` from
+        `make_ybus_numeric` are used in a `SparseMatrix`, so that the symbolic injections
+        `Sc = vc * conjugate(Y * vc)` are built from complex numbers instead of the admittance expressions of
+        each line
+        """
+        if name == 'Y' and subs_param_value:
+            ybus = self.make_ybus_numeric().tocoo()
+            return smp.SparseMatrix(*ybus.shape, {(row, col): complex(value) for row, col, value
+                                                  in zip(ybus.row.tolist(), ybus.col.tolist(), ybus.data)})
+        return super(Line, self).subs_param_custom(name, subs_param_value=subs_param_value)
+
+    def make_gcall_numeric(self):
+        """
+        Create the numeric kernels of the line injections `S = V * conj(Ybus @ V)` with `V = v * exp(1j * a)`,
+        evaluated with the sparse `Ybus` from `make_ybus_numeric`. The active powers go to the bus angle
+        equations and the reactive powers to the bus voltage equations. The Jacobian is computed on the
+        nonzeros of `Ybus` from `T = V[row] * conj(Ybus[row, col] * V[col])`, with
+        `dS[row]/da[col] = 1j * (S[row] if row == col) - 1j * T` and
+        `dS[row]/dv[col] = (S[row] / v[row] if row == col) + T / v[col]`.
+
+        Returns
+        -------
+        None
+        """
+        self._gcall_numeric = []
+        self._gy_numeric = []
+        if self.n == 0:
+            return
+
+        ybus = self.make_ybus_numeric()
+        pattern = ybus.tocoo()
+        row, col, data = pattern.row, pattern.col, pattern.data
+        diag = row == col
+
+        a_addr = np.asarray(self._dae_address['a'], dtype=int)
+        v_addr = np.asarray(self._dae_address['v'], dtype=int)
+
+        def injection(y):
+            v = y[v_addr]
+            vc = v * np.exp(1j * y[a_addr])
+            return v, vc, vc * np.conj(ybus @ vc)
+
+        def g(y):
+            _, _, s = injection(y)
+            return np.concatenate([s.real, s.imag])
+
+        def gy(y):
+            v, vc, s = injection(y)
+            t = vc[row] * np.conj(data * vc[col])
+            ds_da = 1j * np.where(diag, s[row], 0) - 1j * t
+            ds_dv = np.where(diag, s[row] / v[row], 0) + t / v[col]
+            return np.concatenate([ds_da.real, ds_dv.real, ds_da.imag, ds_dv.imag])
+
+        self._gcall_numeric.append((np.concatenate([a_addr, v_addr]), g))
+        self._gy_numeric.append((np.concatenate([a_addr[row], a_addr[row], v_addr[row], v_addr[row]]),
+                                 np.concatenate([a_addr[col], v_addr[col], a_addr[col], v_addr[col]]),
+                                 gy))
+
+    def make_ybus_numeric(self):
+        """
+        Compute the numeric bus admittance matrix `self.Ybus` as a `complex128` CSC matrix from the parameter
+        arrays of `make_device_data`. The branch model is the one used to compute `self.Y` in
+        `compute_param_custom`.
+
+        Returns
+        -------
+        scipy.sparse.csc_matrix : the bus admittance matrix
+        """
+        param = self.make_device_data().__dict__
+        bus1 = self.system.bus.idx2int(self._param_data['bus1'])
+        bus2 = self.system.bus.idx2int(self._param_data['bus2'])
+
+        y1 = param['u'] * (param['g1'] + 0.5 * param['g'] + 1j * (param['b1'] + 0.5 * param['b']))
+        y2 = param['u'] * (param['g2'] + 0.5 * param['g'] + 1j * (param['b2'] + 0.5 * param['b']))
+        y12 = param['u'] / (param['r'] + 1j * param['x'])
+        m = param['tap'] * np.exp(1j * param['phi'])
+        m2 = param['tap'] ** 2
+
+        # duplicate entries of parallel lines are summed in the conversion to csc
+        rows = np.concatenate([bus1, bus1, bus2, bus2])
+        cols = np.concatenate([bus1, bus2, bus1, bus2])
+        data = np.concatenate([(y1 + y12) / m2, -y12 / np.conj(m), -y12 / m, y12 + y2]).astype(np.complex128)
+
+        nbus = self.system.bus.n
+        self.Ybus = coo_matrix((data, (rows, cols)), shape=(nbus, nbus)).tocsc()
+        return self.Ybus
@@ -1,5 +1,10 @@
+from sympy import symbols
+
 from .devicebase import DeviceBase
 
+# symbols of the equations, equal to the symbol singletons of the same names created by `init_symbols`
+p, q = symbols('p q')
+
 
 class PQ(DeviceBase):
     """Class for static PQ load
@@ -21,5 +26,5 @@ class PQ(DeviceBase):
         self._foreign_keys.update({'bus': 'Bus'})
 
         self._algeb_ext.update({'a': ['bus', 'a'], 'v': ['bus', 'v']})
-        self._gcall_ext.update({'a': 'p',
-                                'v': 'q'})
+        self._gcall_ext.update({'a': p,
+                                'v': q})
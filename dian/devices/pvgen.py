@@ -1,39 +1,45 @@
-from .devicebase import DeviceBase
+from types import MappingProxyType
 
+from sympy import symbols
 
-class PV(DeviceBase):
-    """Class for static PV gen
-    """
-
-    def __init__(self, system):
-        super(PV, self).__init__(system)
-        self._param_int.extend(['bus', 'p0', 'q0', 'v0', 'Sn', 'Vn', 'vmax', 'vmin', 'qmax', 'qmin'])
-        self._param_int_non_computational.extend(['bus'])
-        self._param_int_mandatory.extend(['bus'])
-        self._param_int_default.update({'p0': 0,
-                                        'q0': 0,
-                                        'v0': 1,
-                                        'Sn': 100,
-                                        'Vn': 110,
-                                        'vmax': 1.1,
-                                        'vmin': 0.9,
-                                        'qmax': 999,
-                                        'qmin': -999
-                                        })
+from .devicebase import DeviceBase
 
-        self._foreign_keys.update({'bus': 'Bus'})
+# symbols of the equations, equal to the symbol singletons of the same names created by `init_symbols`
+a, a0, p, p0, q, v, v0 = symbols('a a0 p p0 q v v0')
 
-        self._algeb_ext.update({'a': ['bus', 'a'], 'v': ['bus', 'v']})
 
-        self._var_value_initial.update({('Bus', 'v', 'bus', 'set'): 'v0',
-                                        ('self', 'q', 'idx', 'set'): 'q0',
-                                        })
+class PV(DeviceBase):
+    """Class for static PV gen
 
-        self._algeb_int.extend(['q'])
+    The metadata are class attributes shared by all instances, which `DeviceBase.__init__` does not copy
+    """
 
-        self._gcall_int.update({'q': 'v - v0 + 1e-5*q'})
-        self._gcall_ext.update({'a': '-p0',
-                                'v': '-q'})
+    # `name` and `u` are the default parameters of `DeviceBase`
+    _param_int = ('name', 'u', 'bus', 'p0', 'q0', 'v0', 'Sn', 'Vn', 'vmax', 'vmin', 'qmax', 'qmin')
+    _param_int_non_computational = ('name', 'bus')
+    _param_int_mandatory = ('bus', )
+    _param_int_default = MappingProxyType({'name': '',
+                                           'u': 1,
+                                           'p0': 0,
+                                           'q0': 0,
+                                           'v0': 1,
+                                           'Sn': 100,
+                                           'Vn': 110,
+                                           'vmax': 1.1,
+                                           'vmin': 0.9,
+                                           'qmax': 999,
+                                           'qmin': -999
+                                           })
+
+    _foreign_keys = MappingProxyType({'bus': 'Bus'})
+    _algeb_ext = MappingProxyType({'a': ('bus', 'a'), 'v': ('bus', 'v')})
+    _var_value_initial = MappingProxyType({('Bus', 'v', 'bus', 'set'): 'v0',
+                                           ('self', 'q', 'idx', 'set'): 'q0',
+                                           })
+    _algeb_int = ('q', )
+    _gcall_int = MappingProxyType({'q': v - v0 + 1e-5 * q})
+    _gcall_ext = MappingProxyType({'a': -p0,
+                                   'v': -q})
 
 
 class Slack(PV):
@@ -41,16 +47,12 @@ class Slack(PV):
     Class for Slack generator for power flow
     """
 
-    def __init__(self, system):
-        super(Slack, self).__init__(system)
-        self._param_int.extend(['a0'])
-        self._param_int_default.update({'a0': 0})
-
-        self._algeb_int.extend(['p'])
-
-        self._gcall_int.update({'p': 'a - a0 + 1e-5*p'})
-
-        self._gcall_ext.update({'a': '-p'})
-
-        self._var_value_initial.update({('Bus', 'a', 'bus', 'set'): 'a0',
-                                        ('self', 'p', 'idx', 'set'): 'p0'})
+    # metadata of `PV` extended with the slack angle and active power
+    _param_int = PV._param_int + ('a0', )
+    _param_int_default = MappingProxyType({**PV._param_int_default, 'a0': 0})
+    _algeb_int = PV._algeb_int + ('p', )
+    _gcall_int = MappingProxyType({**PV._gcall_int, 'p': a - a0 + 1e-5 * p})
+    _gcall_ext = MappingProxyType({**PV._gcall_ext, 'a': -p})
+    _var_value_initial = MappingProxyType({**PV._var_value_initial,
+                                           ('Bus', 'a', 'bus', 'set'): 'a0',
+                                           ('self', 'p', 'idx', 'set'): 'p0'})
@@ -1,5 +1,10 @@
+from sympy import symbols
+
 from .devicebase import DeviceBase
 
+# symbols of the equations, equal to the symbol singletons of the same names created by `init_symbols`
+pd, qd = symbols('pd qd')
+
 
 class Shunt(DeviceBase):
     """Class for static shunt
@@ -20,8 +25,8 @@ class Shunt(DeviceBase):
 
         self._algeb_ext.update({'a': ['bus', 'a'], 'v': ['bus', 'v']})
 
-        self._gcall_ext.update({'a': 'pd',
-                                'v': 'qd'})
+        self._gcall_ext.update({'a': pd,
+                                'v': qd})
 
         self._var_int_computed.update({'pd': ['u * g * v**2 ', 'vectorized'],
                                        'qd': ['- u * b * v**2', 'vectorized']}
@@ -4,10 +4,13 @@ from .devices.line import Line
 from .devices.pvgen import PV, Slack
 from .devices.shunt import Shunt
 from .dae import DAE
+from collections import defaultdict
+import hashlib
+from sympy import Add
 import logging
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.INFO)
 
 sh = logging.StreamHandler()
 logger.addHandler(sh)
@@ -25,42 +28,85 @@ class System(object):
         self.shunt = Shunt(system=self)
         self.dae = DAE(system=self)
 
-    def collect_algeb_int_equations(self):
-        """Collect algebraic equations defined for device internals"""
-        logger.debug(f'\n--> Entering collect_algeb_int_equations():')
-        for dev in self.devices:
-            dev_ref = self.__dict__[dev]
-            algeb_int_list = dev_ref._algeb_int
-            dae_addr = dev_ref._dae_address
-            gcall_syms = dev_ref._gcall_int_symbolic
+    def call_devices(self, method, *args, devices=None, **kwargs):
+        """
+        Call `method` of the devices with `args` and `kwargs`, one device after another in the order of
+        `devices`
 
-            for variable in algeb_int_list:
-                if variable not in gcall_syms:
-                    logger.debug(f'{variable} internal equation not found in device {dev}')
-                    continue
+        Parameters
+        ----------
+        method : str
+            Name of the device method to call
+        devices : list, optional
+            Names of the devices. Defaults to `self.devices`
 
-                dae_addr_var = dae_addr[variable]
-                for idx, addr in enumerate(dae_addr_var):
-                    self.dae.g[addr] = self.dae.g[addr] + gcall_syms[variable][idx]
-                    # may replace in-place add with assignment
+        Returns
+        -------
+        list : return values of `method` in the order of `devices`
+        """
+        if devices is None:
+            devices = self.devices
+        return [getattr(self.__dict__[dev], method)(*args, **kwargs) for dev in devices]
+
+    def model_key(self, devices=None):
+        """
+        Get a hash of the model definitions and the parameter data of `devices`, which identifies the equations
+        before the symbolic stages build them
+
+        Parameters
+        ----------
+        devices : list, optional
+            Names of the devices. Defaults to `self.devices`
+
+        Returns
+        -------
+        str : the hex digest of the hash
+        """
+        if devices is None:
+            devices = self.devices
+
+        sha = hashlib.sha256()
+        for dev in devices:
+            sha.update(f'{dev}:{self.__dict__[dev].model_repr()}\n'.encode())
+        return sha.hexdigest()
+
+    def collect_algeb_int_equations(self):
+        """Collect algebraic equations defined for device internals"""
+        logger.debug('\n--> Entering collect_algeb_int_equations():')
+        self._collect_algeb_equations('_algeb_int', '_gcall_int_symbolic', 'internal')
 
     def collect_algeb_ext_equations(self):
         """Collect algebraic equations defined for external variables"""
-        logger.debug(f'\n--> Entering collect_algeb_ext_equations():')
+        logger.debug('\n--> Entering collect_algeb_ext_equations():')
+        self._collect_algeb_equations('_algeb_ext', '_gcall_ext_symbolic', 'external')
+
+    def _collect_algeb_equations(self, algeb_name, gcall_name, location):
+        """
+        Add the equations in `gcall_name` of all devices to `dae.g` at the addresses of the variables in
+        `algeb_name`. The terms are gathered by address first, and each equation is updated once with a flat
+        `Add`, instead of rebuilding the sum for every term added to a bus.
+
+        Returns
+        -------
+        None
+        """
+        terms = defaultdict(list)
         for dev in self.devices:
             dev_ref = self.__dict__[dev]
-            algeb_ext_list = dev_ref._algeb_ext.keys()
             dae_addr = dev_ref._dae_address
-            gcall_syms = dev_ref._gcall_ext_symbolic
+            gcall_syms = dev_ref.__dict__[gcall_name]
 
-            for variable in algeb_ext_list:
+            for variable in dev_ref.__dict__[algeb_name]:
                 if variable not in gcall_syms:
-                    logger.debug(f'{variable} external equation not found in device {dev}')
+                    logger.debug('%s %s equation not found in device %s', variable, location, dev)
                     continue
 
-                dae_addr_var = dae_addr[variable]
-                for idx, addr in enumerate(dae_addr_var):
-                    self.dae.g[addr] = self.dae.g[addr] + gcall_syms[variable][idx]
+                for addr, equation in zip(dae_addr[variable], gcall_syms[variable]):
+                    terms[addr].append(equation)
+
+        g = self.dae.g
+        for addr, addr_terms in terms.items():
+            g[addr] = Add(g[addr], *addr_terms)
 
     def collect_initial_values(self):
         """
@@ -74,6 +120,8 @@ class System(object):
         dae = self.dae
         for dev in self.devices:
             dev_ref = self.__dict__[dev]
+            if dev_ref.n == 0:
+                continue
             dae_addr = dev_ref._dae_address
 
             for variable in dev_ref._algeb_int:
@@ -1,13 +1,184 @@
+import builtins
+import functools
+import io
+import keyword
+import logging
+import tokenize
+import types
+
 import sympy
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import symengine
+except ImportError:
+    symengine = None
+
+logger = logging.getLogger(__name__)
+
+# names defined for the sympy parser, which are not turned into symbols
+_PARSER_NAMESPACE = dict()
+exec('from sympy import *', _PARSER_NAMESPACE)
+_PARSER_NAMESPACE.update({name: obj for name, obj in vars(builtins).items()
+                          if isinstance(obj, types.BuiltinFunctionType)})
 
-def non_commutative_sympify(expr_string):
-    parsed_expr = sympy.parsing.sympy_parser.parse_expr(
-        expr_string,
-        evaluate=False
-    )
 
-    new_locals = {sym.name: sympy.Symbol(sym.name, commutative=False)
-                  for sym in parsed_expr.atoms(sympy.Symbol)}
+def _symbol_names(expr_string):
+    """
+    Get the names in `expr_string` that the sympy parser turns into symbols, i.e., names not defined in the
+    sympy namespace and not called as functions
+    """
+    tokens = list(tokenize.generate_tokens(io.StringIO(expr_string).readline))
+    names = set()
+    for prev, tok, nxt in zip([None] + tokens[:-1], tokens, tokens[1:] + [None]):
+        if tok.type != tokenize.NAME or keyword.iskeyword(tok.string) or tok.string in _PARSER_NAMESPACE:
+            continue
+        if (prev is not None and prev.string == '.') or (nxt is not None and nxt.string == '('):
+            continue
+        names.add(tok.string)
+    return names
+
+
+@functools.lru_cache(maxsize=4096)
+def non_commutative_sympify(expr_string):
+    """Sympify `expr_string` with all symbols being non-commutative. Results are cached by the string."""
+    # the symbol names are found by tokenizing, so that the string is parsed only once
+    new_locals = {name: sympy.Symbol(name, commutative=False) for name in _symbol_names(expr_string)}
 
     return sympy.sympify(expr_string, locals=new_locals)
+
+
+def cached_sympify(expr_string, locals=None):
+    """
+    Sympify the equation string `expr_string` with the `locals` namespace. Equation strings are shared by all
+    instances of a device class; the parsed results are cached by the string and the namespace.
+
+    Parameters
+    ----------
+    expr_string : str
+        The equation string
+    locals : dict
+        A dictionary of the names to be used in the parsing, usually the symbol singletons
+
+    Returns
+    -------
+    sympy.Basic : the sympified expression
+    """
+    local_items = frozenset(locals.items()) if locals else None
+    return _cached_sympify(expr_string, local_items)
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_sympify(expr_string, local_items):
+    locals = dict(local_items) if local_items is not None else None
+    return sympy.sympify(expr_string, locals=locals)
+
+
+def jit(func, **kwargs):
+    """
+    Compile `func` with `numba.njit` if numba is installed. Otherwise, return `func` unchanged.
+
+    numba compiles at the first call. If `func` cannot be compiled in nopython mode, a warning is logged and
+    `func` is called without numba from then on.
+
+    Parameters
+    ----------
+    func : function
+        The function to compile, usually created by `sympy.lambdify` with `modules='numpy'`
+    kwargs
+        Options passed to `numba.njit`
+
+    Returns
+    -------
+    function : the compiled function or `func`
+    """
+    if numba is None:
+        return func
+
+    compiled = numba.njit(**kwargs)(func)
+
+    @functools.wraps(func)
+    def wrapped(*args):
+        nonlocal compiled
+        try:
+            return compiled(*args)
+        except numba.core.errors.NumbaError as e:
+            logger.warning('numba failed to compile %s. Falling back to Python: %s', func.__name__, e)
+            compiled = func
+            return func(*args)
+
+    return wrapped
+
+
+def _to_symengine(exprs, args):
+    """
+    Convert sympy `exprs` and `args` to symengine. symengine does not keep sympy assumptions or dummies, so
+    `args` are converted as plain symbols with the same names.
+
+    Returns
+    -------
+    tuple : (symengine expressions, symengine symbols, dict mapping plain sympy symbols back to `args`)
+    """
+    plain = [sympy.Symbol(arg.name) for arg in args]
+    to_plain = dict(zip(args, plain))
+    from_plain = dict(zip(plain, args))
+
+    se_exprs = [symengine.sympify(sympy.sympify(expr).xreplace(to_plain)) for expr in exprs]
+    se_args = [symengine.sympify(arg) for arg in plain]
+    return se_exprs, se_args, from_plain
+
+
+def jacobian(exprs, args):
+    """
+    Compute the Jacobian matrix of `exprs` with respect to `args`. Differentiation is done by symengine if
+    installed. Otherwise, `sympy.Matrix.jacobian` is used.
+
+    Parameters
+    ----------
+    exprs : list
+        A list of sympy expressions
+    args : list
+        A list of sympy symbols. The symbols must have unique names
+
+    Returns
+    -------
+    sympy.Matrix : the Jacobian matrix
+    """
+    if symengine is None:
+        return sympy.Matrix(exprs).jacobian(args)
+
+    se_exprs, se_args, from_plain = _to_symengine(exprs, args)
+    se_jac = symengine.Matrix(se_exprs).jacobian(symengine.Matrix(se_args))
+
+    return sympy.Matrix(se_jac.rows, se_jac.cols,
+                        [sympy.sympify(item).xreplace(from_plain) for item in se_jac])
+
+
+def llvm_lambdify(args, exprs):
+    """
+    Compile real-valued `exprs` into machine code with `symengine.Lambdify` and the LLVM backend
+
+    Parameters
+    ----------
+    args : list
+        A list of sympy symbols. The symbols must have unique names
+    exprs : list
+        A list of sympy expressions
+
+    Returns
+    -------
+    function or None : the function taking an array of `args` and returning an array of `exprs`, or None if
+    symengine is not installed or not built with LLVM
+    """
+    if symengine is None:
+        return None
+
+    se_exprs, se_args, _ = _to_symengine(exprs, args)
+    try:
+        return symengine.Lambdify(se_args, se_exprs, backend='llvm', cse=True, real=True)
+    except (ValueError, RuntimeError):
+        return None
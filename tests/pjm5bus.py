@@ -1,4 +1,6 @@
 import logging
+import os
+import tempfile
 import time
 import numpy as np  # NOQA
 import sympy as smp  # NOQA
@@ -8,12 +10,11 @@ from scipy.optimize import newton_krylov  # NOQA
 
 from dian.system import System
 
-# set up logger.infoing options for `sympy` and `numpy`
-smp.init_printing()
+# set up printing options for `numpy`
 np.set_printoptions(suppress=True)
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.INFO)
 
 
 system = System()
@@ -42,87 +43,41 @@ system.pv.add_element(idx=3, name="PV 5", bus=4, p0=4.6651, v0=1)
 
 system.slack.add_element(idx=0, name="Slack 1", bus=3, v0=1, a0=0)
 
-system.bus.metadata_check()
-system.pq.metadata_check()
-system.line.metadata_check()
-system.pv.metadata_check()
-system.slack.metadata_check()
-
-system.bus.init_symbols()
-system.pq.init_symbols()
-system.line.init_symbols()
-system.pv.init_symbols()
-system.slack.init_symbols()
-
-system.bus.init_data(subs_param_value=False)
-system.pq.init_data(subs_param_value=False)
-system.line.init_data(subs_param_value=False)
-system.pv.init_data(subs_param_value=False)
-system.slack.init_data(subs_param_value=False)
-
-system.bus.get_var_address()
-system.pq.get_var_address()
-system.line.get_var_address()
-system.pv.get_var_address()
-system.slack.get_var_address()
-
-system.bus.get_algeb_ext()
-system.pq.get_algeb_ext()
-system.line.get_algeb_ext()
-system.pv.get_algeb_ext()
-system.slack.get_algeb_ext()
-
-system.bus.compute_param_int()
-system.pq.compute_param_int()
-system.line.compute_param_int()
-system.pv.compute_param_int()
-system.slack.compute_param_int()
-
-system.bus.compute_param_custom()
-system.pq.compute_param_custom()
-system.line.compute_param_custom()
-system.pv.compute_param_custom()
-system.slack.compute_param_custom()
-
-system.bus.compute_variable()
-system.pq.compute_variable()
-system.line.compute_variable()
-system.pv.compute_variable()
-system.slack.compute_variable()
-
-system.bus.make_gcall_int_symbolic()
-system.pq.make_gcall_int_symbolic()
-system.line.make_gcall_int_symbolic()
-system.pv.make_gcall_int_symbolic()
-system.slack.make_gcall_int_symbolic()
-
-system.bus.make_gcall_ext_symbolic()
-system.pq.make_gcall_ext_symbolic()
-system.line.make_gcall_ext_symbolic()
-system.pv.make_gcall_ext_symbolic()
-system.slack.make_gcall_ext_symbolic()
-
-system.bus.create_param_symbol_value_pair()
-system.pq.create_param_symbol_value_pair()
-system.line.create_param_symbol_value_pair()
-system.pv.create_param_symbol_value_pair()
-system.slack.create_param_symbol_value_pair()
-
-system.bus.delayed_symbol_sub_all(subs_param_value=True)
-system.pq.delayed_symbol_sub_all(subs_param_value=True)
-system.line.delayed_symbol_sub_all(subs_param_value=True)
-system.pv.delayed_symbol_sub_all(subs_param_value=True)
-system.slack.delayed_symbol_sub_all(subs_param_value=True)
+# stages are called for all the models at once, in the order of models
+models = ['bus', 'pq', 'line', 'pv', 'slack']
+
+system.call_devices('metadata_check', devices=models)
+system.call_devices('init_symbols', devices=models)
+system.call_devices('init_data', devices=models, subs_param_value=False)
+
+# addresses are allocated in the order of models
+system.call_devices('get_var_address', devices=models)
+
+system.call_devices('get_algeb_ext', devices=models)
 
 system.dae.initialize_xyfg_empty()
-system.collect_algeb_int_equations()
-system.collect_algeb_ext_equations()
 
-system.bus.compute_and_set_initial_values(subs_param_value=True)
-system.pq.compute_and_set_initial_values(subs_param_value=True)
-system.line.compute_and_set_initial_values(subs_param_value=True)
-system.pv.compute_and_set_initial_values(subs_param_value=True)
-system.slack.compute_and_set_initial_values(subs_param_value=True)
+
+def build():
+    """Build the symbolic equations, which are only needed to generate the module of this case"""
+    for stage in ('compute_all', 'make_gcall_int_symbolic', 'make_gcall_ext_symbolic',
+                  'create_param_symbol_value_pair'):
+        system.call_devices(stage, devices=models)
+
+    system.call_devices('delayed_symbol_sub_all', devices=models, subs_param_value=True)
+
+    system.collect_algeb_int_equations()
+    system.collect_algeb_ext_equations()
+
+
+# generate the residual and the Jacobian as straight-line code for this case, and use them in `solve_algebs`.
+# The module is cached by the model in `DIAN_CACHE_DIR`, or in `dian_cache` in the temporary directory, and
+# later runs load it without building the symbolic equations
+cache_dir = os.environ.get('DIAN_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dian_cache'))
+system.dae.load_cached_specialized(cache_dir, build=build)
+
+# initial values of external variables are set in the order of models
+system.call_devices('compute_and_set_initial_values', devices=models, subs_param_value=True)
 
 system.collect_initial_values()
 
@@ -132,15 +87,19 @@ logger.info(system.dae.summary())
 # TODO: probably allow for setting default/fool-proof initial values when defining the variable
 
 t0 = time.time()
-sol = system.dae.solve_algebs(method='newton_krylov')
+sol = system.dae.solve_algebs(method='auto')
 te = time.time() - t0
 
-logger.info(f'Elapsed time: {te}s')
+logger.info('Elapsed time: %.4fs', te)
 
 logger.info('\n--> Power flow results:')
-logger.info(f'Voltage phases (deg): {np.degrees(sol[0:system.bus.n])}')
-logger.info(f'Voltage magnitudes (pu): {sol[system.bus.n:2*system.bus.n]}')
-logger.info(f'Reactive power for pv, slack (pu): '
-            f'{sol[2*system.bus.n:2*system.bus.n + system.pv.n + system.slack.n]}')
-logger.info(f'Active power for slack (pu): '
-            f'{sol[2*system.bus.n + system.pv.n + system.slack.n]}')
+n, npv, nslk = system.bus.n, system.pv.n, system.slack.n
+ang = np.rad2deg(sol[:n])
+mag = sol[n:2 * n]
+q = sol[2 * n:2 * n + npv + nslk]
+ps = sol[2 * n + npv + nslk]
+
+logger.info('Voltage phases (deg): %s', ang)
+logger.info('Voltage magnitudes (pu): %s', mag)
+logger.info('Reactive power for pv, slack (pu): %s', q)
+logger.info('Active power for slack (pu): %s', ps)
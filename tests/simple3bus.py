@@ -8,12 +8,11 @@ from scipy.optimize import newton_krylov  # NOQA
 
 from dian.system import System
 
-# set up printing options for `sympy` and `numpy`
-smp.init_printing()
+# set up printing options for `numpy`
 np.set_printoptions(suppress=True)
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.INFO)
 
 
 system = System()
@@ -64,23 +63,11 @@ system.line.get_algeb_ext()
 system.pv.get_algeb_ext()
 system.slack.get_algeb_ext()
 
-system.bus.compute_param_int()
-system.pq.compute_param_int()
-system.line.compute_param_int()
-system.pv.compute_param_int()
-system.slack.compute_param_int()
-
-system.bus.compute_param_custom()
-system.pq.compute_param_custom()
-system.line.compute_param_custom()
-system.pv.compute_param_custom()
-system.slack.compute_param_custom()
-
-system.bus.compute_variable()
-system.pq.compute_variable()
-system.line.compute_variable()
-system.pv.compute_variable()
-system.slack.compute_variable()
+system.bus.compute_all()
+system.pq.compute_all()
+system.line.compute_all()
+system.pv.compute_all()
+system.slack.compute_all()
 
 system.bus.make_gcall_int_symbolic()
 system.pq.make_gcall_int_symbolic()
@@ -110,6 +97,9 @@ system.dae.initialize_xyfg_empty()
 system.collect_algeb_int_equations()
 system.collect_algeb_ext_equations()
 
+# lambdify the residual once; `solve_algebs` reuses `dae.g_func`
+system.dae.lambdify_algebs()
+
 system.bus.compute_and_set_initial_values(subs_param_value=True)
 system.pq.compute_and_set_initial_values(subs_param_value=True)
 system.line.compute_and_set_initial_values(subs_param_value=True)
@@ -125,15 +115,19 @@ logger.info(system.dae.summary())
 # TODO: probably allow for setting default/fool-proof initial values when defining the variable
 
 t0 = time.time()
-sol = system.dae.solve_algebs(method='newton_krylov')
+sol = system.dae.solve_algebs(method='auto')
 te = time.time() - t0
 
-logger.info(f'Elapsed time: {te}s')
+logger.info('Elapsed time: %.4fs', te)
 
 logger.info('\n--> Power flow results:')
-logger.info(f'Voltage phases (deg): {np.degrees(sol[0:system.bus.n])}')
-logger.info(f'Voltage magnitudes (pu): {sol[system.bus.n:2*system.bus.n]}')
-logger.info(f'Reactive power for pv, slack (pu): '
-            f'{sol[2*system.bus.n:2*system.bus.n + system.pv.n + system.slack.n]}')
-logger.info(f'Active power for slack (pu): '
-            f'{sol[2*system.bus.n + system.pv.n + system.slack.n]}')
+n, npv, nslk = system.bus.n, system.pv.n, system.slack.n
+ang = np.rad2deg(sol[:n])
+mag = sol[n:2 * n]
+q = sol[2 * n:2 * n + npv + nslk]
+ps = sol[2 * n + npv + nslk]
+
+logger.info('Voltage phases (deg): %s', ang)
+logger.info('Voltage magnitudes (pu): %s', mag)
+logger.info('Reactive power for pv, slack (pu): %s', q)
+logger.info('Active power for slack (pu): %s', ps)
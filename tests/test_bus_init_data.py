@@ -23,3 +23,11 @@ class TestInitData(unittest.TestCase):
         self.system.bus.init_equation()
         self.system.bus.get_var_address()
         self.system.pq.get_algeb_ext()
+
+    def test_init_equation_residual_views(self):
+        self.system.bus.init_data()
+        self.system.bus.init_equation()
+        bus = self.system.bus
+        self.assertEqual(bus._residuals.shape, (2, 10))
+        self.assertTrue(np.shares_memory(bus._a, bus._residuals))
+        self.assertTrue(np.shares_memory(bus._v, bus._residuals))
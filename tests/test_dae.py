@@ -0,0 +1,203 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import numpy as np
+from sympy import symbols, sympify, exp, re, im, I
+
+from dian.dae import DAE
+from dian.system import System
+from dian.utils import jit
+
+
+class TestDAE(unittest.TestCase):
+    def setUp(self) -> None:
+        # a two-bus-like system: v * exp(I*a) with the real and imaginary parts specified
+        self.dae = DAE(system=None)
+        a, v = symbols('a v')
+        self.dae.y = [a, v]
+        self.dae.m = 2
+        self.dae.initialize_xyfg_empty()
+        self.dae.g = [re(v * exp(I * a)) - 0.6, im(v * exp(I * a)) - 0.8]
+        self.dae.y_num = np.array([0.1, 0.9])
+
+    def test_make_jac_symbolic(self):
+        self.dae.make_jac_symbolic()
+        self.assertEqual(len(self.dae.gy), 4)
+
+        a, v = 0.3, 1.2
+        expected = np.array([[-v * np.sin(a), np.cos(a)],
+                             [v * np.cos(a), np.sin(a)]])
+        np.testing.assert_allclose(self.dae.eval_jac(np.array([a, v])).toarray(), expected)
+
+        # columns permuted as in a reused LU ordering
+        perm_c = np.array([1, 0])
+        np.testing.assert_allclose(self.dae.eval_jac(np.array([a, v]), perm_c=perm_c).toarray(),
+                                   expected[:, perm_c])
+
+    def test_lambdify_algebs(self):
+        self.dae.lambdify_algebs()
+        a, v = 0.3, 1.2
+        np.testing.assert_allclose(self.dae.g_func(np.array([a, v])),
+                                   [v * np.cos(a) - 0.6, v * np.sin(a) - 0.8])
+
+    def test_jit_fallback(self):
+        # functions that numba cannot compile in nopython mode are called without numba
+        func = jit(lambda y: float(sympify(y[0]) * 2))
+        with self.assertLogs('dian.utils', level='WARNING'):
+            self.assertEqual(func(np.array([1.5])), 3.0)
+        self.assertEqual(func(np.array([2.0])), 4.0)
+
+    def test_newton_sparse(self):
+        sol = self.dae.solve_algebs(method='newton_sparse')
+        np.testing.assert_allclose(sol, [np.arctan2(0.8, 0.6), 1.0])
+
+    def test_solve_algebs_root(self):
+        for method in ('auto', 'hybr', 'lm'):
+            sol = self.dae.solve_algebs(method=method)
+            np.testing.assert_allclose(sol, [np.arctan2(0.8, 0.6), 1.0])
+
+        # `auto` uses the sparse Newton method for larger systems
+        sol = self.dae.solve_algebs(method='auto', dense_threshold=1)
+        np.testing.assert_allclose(sol, [np.arctan2(0.8, 0.6), 1.0])
+
+    def test_solve_algebs_batch(self):
+        y0_batch = np.array([[0.1, 0.5, 1.0, -0.2],
+                             [0.9, 1.1, 1.5, 0.8]])
+        sol = self.dae.solve_algebs_batch(y0_batch)
+        self.dae.lambdify_algebs()
+        self.assertEqual(sol.shape, (2, 4))
+        for k in range(4):
+            np.testing.assert_allclose(sol[:, k], [np.arctan2(0.8, 0.6), 1.0])
+            np.testing.assert_allclose(self.dae.g_batch_func(sol)[:, k], self.dae.g_func(sol[:, k]), atol=1e-12)
+
+    @unittest.skipUnless(importlib.util.find_spec('Cython'), 'Cython is not installed')
+    def test_lambdify_algebs_cython(self):
+        self.dae.lambdify_algebs()
+        expected = self.dae.g_func(self.dae.y_num)
+
+        self.dae.lambdify_algebs(backend='cython')
+        np.testing.assert_allclose(self.dae.g_func(self.dae.y_num), expected)
+
+    @unittest.skipUnless(importlib.util.find_spec('symengine'), 'symengine is not installed')
+    def test_lambdify_algebs_llvm(self):
+        self.dae.lambdify_algebs()
+        expected = self.dae.g_func(self.dae.y_num)
+
+        self.dae.lambdify_algebs(backend='llvm')
+        np.testing.assert_allclose(self.dae.g_func(self.dae.y_num), expected)
+
+        sol = self.dae.solve_algebs(method='newton_sparse')
+        np.testing.assert_allclose(sol, [np.arctan2(0.8, 0.6), 1.0])
+
+    def test_generate_specialized(self):
+        self.dae.lambdify_algebs()
+        self.dae.make_jac_symbolic()
+        y = np.array([0.3, 1.2])
+        expected_g = self.dae.g_func(y)
+        expected_gy = self.dae.eval_jac(y).toarray()
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'specialized.py')
+            self.dae.generate_specialized(path)
+            self.dae.load_specialized(path)
+
+        np.testing.assert_allclose(self.dae.g_func(y), expected_g)
+        np.testing.assert_allclose(self.dae.eval_jac(y).toarray(), expected_gy)
+
+    def test_generate_specialized_after_load(self):
+        # a loaded module has no symbolic Jacobian, which is rebuilt to generate the module again
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'specialized.py')
+            self.dae.generate_specialized(path)
+
+            dae = DAE(system=None)
+            dae.y, dae.m = self.dae.y, self.dae.m
+            dae.initialize_xyfg_empty()
+            dae.g = self.dae.g
+            dae.load_specialized(path)
+
+            path_again = os.path.join(tempdir, 'specialized_again.py')
+            dae.generate_specialized(path_again)
+            with open(path) as f, open(path_again) as f_again:
+                self.assertEqual(f.read(), f_again.read())
+            self.assertEqual(len(dae.gy), len(dae.gy_rows))
+
+    def test_load_cached_specialized(self):
+        y = np.array([0.3, 1.2])
+        with tempfile.TemporaryDirectory() as tempdir:
+            self.dae.load_cached_specialized(tempdir)
+            path, = [item for item in os.listdir(tempdir) if item.endswith('.py')]
+            mtime = os.path.getmtime(os.path.join(tempdir, path))
+
+            # the cached module is reused for the same equations
+            self.dae.load_cached_specialized(tempdir)
+            self.assertEqual(os.path.getmtime(os.path.join(tempdir, path)), mtime)
+            expected_g = self.dae.g_func(y)
+
+            # and generated again for new equations
+            a, v = self.dae.y
+            self.dae.initialize_xyfg_empty()
+            self.dae.g = [re(v * exp(I * a)) - 0.5, im(v * exp(I * a)) - 0.8]
+            self.dae.load_cached_specialized(tempdir)
+            self.assertEqual(len([item for item in os.listdir(tempdir) if item.endswith('.py')]), 2)
+            np.testing.assert_allclose(self.dae.g_func(y), expected_g + [0.1, 0])
+
+
+class TestKernels(unittest.TestCase):
+    def setUp(self) -> None:
+        # one bus with a load and the slack generator
+        self.system = System()
+        self.system.bus.add_element(idx=0, name="Bus 1", Vn=110)
+        self.system.pq.add_element(idx=0, name="PQ 1", bus=0, p=3, q=0.9861)
+        self.system.slack.add_element(idx=0, name="Slack 1", bus=0, v0=1.02, a0=0.1)
+        self.devices = ['bus', 'pq', 'slack']
+
+        for method in ('metadata_check', 'init_symbols'):
+            self.system.call_devices(method, devices=self.devices)
+        self.system.call_devices('init_data', subs_param_value=False, devices=self.devices)
+        for method in ('get_var_address', 'get_algeb_ext'):
+            self.system.call_devices(method, devices=self.devices)
+        self.system.dae.initialize_xyfg_empty()
+
+    def test_kernels(self):
+        dae = self.system.dae
+        dae.lambdify_algebs(backend='kernels')
+
+        # the kernels need no symbolic equations in `dae.g`
+        self.assertEqual(dae.g, [0] * dae.m)
+        sol = dae.solve_algebs(method='newton_sparse')
+        q, p = 0.9861, 3
+        np.testing.assert_allclose(sol, [0.1 - 1e-5 * p, 1.02 - 1e-5 * q, q, p])
+
+        # the kernels read the parameters from the arrays of the device data
+        self.system.pq._device_data.p[:] = 2
+        sol = dae.solve_algebs(method='newton_sparse')
+        np.testing.assert_allclose(sol, [0.1 - 1e-5 * 2, 1.02 - 1e-5 * q, q, 2])
+
+    def test_model_key(self):
+        # the key is known before the symbolic stages, which do not change it, and changes with the parameters
+        key = self.system.model_key()
+        self.test_kernels_symbolic()
+        self.assertEqual(self.system.model_key(), key)
+
+        self.system.pq._param_data['p'][0] = 2
+        self.assertNotEqual(self.system.model_key(), key)
+
+    def test_kernels_symbolic(self):
+        for method in ('compute_all', 'make_gcall_int_symbolic', 'make_gcall_ext_symbolic',
+                       'create_param_symbol_value_pair'):
+            self.system.call_devices(method, devices=self.devices)
+        self.system.call_devices('delayed_symbol_sub_all', subs_param_value=True, devices=self.devices)
+        self.system.collect_algeb_int_equations()
+        self.system.collect_algeb_ext_equations()
+
+        dae = self.system.dae
+        y = np.array([0.2, 1.1, 0.5, 2.0])
+        dae.lambdify_algebs()
+        expected_g = dae.g_func(y)
+        expected_gy = dae.eval_jac(y).toarray()
+
+        dae.lambdify_algebs(backend='kernels')
+        np.testing.assert_allclose(dae.g_func(y), expected_g)
+        np.testing.assert_allclose(dae.eval_jac(y).toarray(), expected_gy)
@@ -1,7 +1,11 @@
+import inspect
 import unittest
+from unittest.mock import patch
 import numpy as np
+from sympy import Float, Symbol, sympify
 from dian.system import System
-from dian.devices.devicebase import DeviceBase
+from dian.devices.pvgen import PV
+from dian.devices.devicebase import DeviceBase, DeviceData, _CACHE_SIZE, _cached_lambdify, _memoized_subs
 
 
 class TestDeviceBase(unittest.TestCase):
@@ -24,9 +28,259 @@ class TestDeviceBase(unittest.TestCase):
         self.system.bus.metadata_check()
         self.test_device.metadata_check()
 
+    def test_param_arrays(self):
+        line = self.system.line
+        line.add_element(idx=0, bus1=0, bus2=1, r=0.01, x=0.1)
+        line.add_element(idx=1, bus1=1, bus2=2, x=0.2)
+        line.metadata_check()
+
+        # numeric parameters are stored as arrays, and names are kept as lists
+        np.testing.assert_array_equal(line._param_data['x'], [0.1, 0.2])
+        np.testing.assert_array_equal(line._param_data['bus1'], [0, 1])
+        self.assertIsInstance(line._param_data['name'], list)
+
+        line.add_element(idx=2, bus1=2, bus2=3)
+        self.assertEqual(line._param_data['r'], [0.01, 1e-4, 1e-4])
+
+    def test_sympify_gcall(self):
+        pv1, pv2 = System().pv, System().pv
+        pv1.init_symbols()
+        pv2.init_symbols()
+
+        # equations defined with symbols are used as they are, and strings are parsed with the singletons
+        equation = pv1._gcall_int['q']
+        self.assertIs(pv1._sympify_gcall(equation), equation)
+        self.assertEqual(pv1._sympify_gcall('v - v0 + 1e-5*q'), equation)
+
+        # the parsed singleton is shared by instances with the same symbol singletons
+        self.assertIs(pv1._sympify_gcall('v - v0'), pv2._sympify_gcall('v - v0'))
+
+        # but not by instances with other singletons
+        pv2._symbol_singleton['v'] = Symbol('v', commutative=False)
+        self.assertFalse(pv2._sympify_gcall(equation).is_commutative)
+        self.assertFalse(pv2._sympify_gcall('v - v0').is_commutative)
+        self.assertTrue(pv1._sympify_gcall('v - v0').is_commutative)
+
+    def test_class_metadata(self):
+        # the metadata of PV and Slack are read from the classes without copies
+        pv1, pv2 = System().pv, System().pv
+        self.assertIs(pv1._gcall_int, PV._gcall_int)
+        self.assertIs(pv1._param_int, pv2._param_int)
+        self.assertEqual(System().slack._gcall_ext['a'], -Symbol('p'))
+        self.assertEqual(pv1._gcall_ext['a'], -Symbol('p0'))
+        with self.assertRaises(TypeError):
+            pv1._gcall_int['q'] = 0
+
+        # devices without class-level metadata create their own
+        self.assertIsNot(System().bus._param_int, System().bus._param_int)
+
     def test_init_data(self):
         # _init_data for bus and TestDevice
         self.system.bus.init_data()
         self.test_device.init_data()
 
         self.assertEqual(self.system.bus.n, 10)
+
+    def test_idx2int(self):
+        bus = self.system.bus
+        np.testing.assert_array_equal(bus.idx2int([4, 2, 0]), [4, 2, 0])
+
+        # repeated lookups are cached, and the returned arrays can be modified without affecting the cache
+        ret = bus.idx2int([4, 2, 0])
+        ret[0] = 9
+        np.testing.assert_array_equal(bus.idx2int(np.array([4, 2, 0])), [4, 2, 0])
+        self.assertEqual(len(bus._idx2int_cache), 1)
+
+        # the cache is cleared when elements are added
+        bus.add_element(idx=20)
+        np.testing.assert_array_equal(bus.idx2int([20, 0]), [10, 0])
+
+    def test_idx2int_non_integer_idx(self):
+        pq = self.system.pq
+        pq.add_element(idx='PQ_1', bus=0)
+        pq.add_element(idx=7, bus=2)
+        np.testing.assert_array_equal(pq.idx2int([7, 'PQ_1']), [1, 0])
+
+        with self.assertRaises(KeyError):
+            self.system.bus.idx2int([10])
+
+    def test_get_fast_array(self):
+        bus = self.system.bus
+        bus.init_data()
+        fast = bus._get_fast_array('v')
+        self.assertEqual(fast.dtype, object)
+        self.assertEqual(list(fast), list(bus.v))
+        self.assertIs(bus._get_fast_array('v'), fast)
+
+        # replacing the symbol array rebuilds the companion
+        bus.v = bus.a
+        self.assertEqual(list(bus._get_fast_array('v')), list(bus.a))
+
+    def test_subs_all_vectorized_xreplace(self):
+        bus = self.system.bus
+        bus.init_data()
+        a, v = Symbol('a'), Symbol('v')
+        equation = sympify('exp(a - v) * (v + exp(a - v)) + cos(a - v)', locals={'a': a, 'v': v})
+
+        expected = [equation.subs([(a, a_i), (v, v_i)]) for a_i, v_i in zip(bus.a, bus.v)]
+        self.assertEqual(bus._subs_all_vectorized(equation), expected)
+
+    def test_subs_cache(self):
+        bus = self.system.bus
+        bus.init_data()
+        a, v = Symbol('a'), Symbol('v')
+        equation = sympify('v * cos(a) + v**2', locals={'a': a, 'v': v})
+        expected = bus._subs_all_vectorized(equation)
+
+        # initializing another device keeps the memoized substitutions, which are bounded in size
+        self.test_device.init_data()
+        hits = _memoized_subs.cache_info().hits
+        self.assertEqual(bus._subs_all_vectorized(equation), expected)
+        self.assertEqual(_memoized_subs.cache_info().hits, hits + bus.n)
+        self.assertEqual(_memoized_subs.cache_info().maxsize, _CACHE_SIZE)
+
+    def test_subs_all_vectorized_param_value(self):
+        bus = self.system.bus
+        bus.init_data()
+        v, Vn = Symbol('v'), Symbol('Vn')
+        equation = sympify('v**2 / 2 + Vn / 3 + I*v', locals={'v': v, 'Vn': Vn}) + Float(0.30000000000000004) * v
+
+        # parameters are numbers and variables are symbols. Floats keep all their digits
+        expected = [equation.xreplace({v: v_i, Vn: sympify(Vn_i)})
+                    for v_i, Vn_i in zip(bus.v, bus._param_data['Vn'])]
+        self.assertEqual(bus._subs_all_vectorized(equation, subs_param_value=True), expected)
+
+    def test_subs_all_vectorized_cse(self):
+        bus = self.system.bus
+        bus.init_data()
+        bus._param_data['Vn'] = np.linspace(0.1, 0.2, bus.n)
+        a, v, Vn = Symbol('a'), Symbol('v'), Symbol('Vn')
+        equation = sympify('v**2 * (Vn * cos(a - Vn) + 2 * sin(a - Vn))', locals={'a': a, 'v': v, 'Vn': Vn})
+
+        # the common subexpression `a - Vn` is built once per element and the results equal `xreplace`
+        expected = [equation.xreplace({a: a_i, v: v_i, Vn: sympify(Vn_i)})
+                    for a_i, v_i, Vn_i in zip(bus.a, bus.v, bus._param_data['Vn'])]
+        self.assertEqual(bus._subs_all_vectorized(equation, subs_param_value=True), expected)
+        source = inspect.getsource(_cached_lambdify((Vn, a, v), equation, modules='sympy'))
+        self.assertIn('cos(x0)', source)
+        self.assertIn('sin(x0)', source)
+
+    def test_subs_all_vectorized_param_linear(self):
+        bus = self.system.bus
+        bus.init_data()
+        bus._param_data['Vn'] = np.linspace(100., 120., bus.n)
+        a, v, Vn = Symbol('a'), Symbol('v'), Symbol('Vn')
+        equation = sympify('Vn * v + 2 * Vn * a + exp(Vn / 100) + v**2 - a * v / Vn',
+                           locals={'a': a, 'v': v, 'Vn': Vn})
+
+        # coefficients of the variables are evaluated numerically for all the buses
+        ret = bus._subs_all_vectorized(equation, subs_param_value=True)
+        for eq, a_i, v_i, Vn_i in zip(ret, bus.a, bus.v, bus._param_data['Vn']):
+            expected = equation.xreplace({a: a_i, v: v_i, Vn: sympify(Vn_i)})
+            self.assertEqual(eq.free_symbols, {a_i, v_i})
+            self.assertAlmostEqual(float((eq - expected).xreplace({a_i: 0.3, v_i: 1.1})), 0)
+
+    def test_subs_param_linear_pv(self):
+        # the PV equations are linear in the float setpoints, with the bus voltages and `q` as symbols
+        system = System()
+        system.bus.add_element(idx=0)
+        system.bus.add_element(idx=1)
+        system.pv.add_element(idx=0, bus=0, p0=0.5, v0=1.02)
+        system.pv.add_element(idx=1, bus=1, p0=0.2, v0=0.98)
+        for stage in ('metadata_check', 'init_symbols', 'init_data', 'get_var_address'):
+            system.call_devices(stage, devices=['bus', 'pv'])
+        pv = system.pv
+        pv.get_algeb_ext()
+        pv.make_gcall_int_symbolic()
+
+        results = dict()
+        subs_param_linear = pv._subs_param_linear
+
+        def spy(equation_singleton, *args):
+            results[equation_singleton] = subs_param_linear(equation_singleton, *args)
+            return results[equation_singleton]
+
+        with patch.object(pv, '_subs_param_linear', side_effect=spy):
+            pv.delayed_symbol_sub_all(subs_param_value=True)
+
+        equation = pv._gcall_int['q']
+        expected = [equation.xreplace({Symbol('v'): v_i, Symbol('v0'): sympify(v0_i), Symbol('q'): q_i})
+                    for v_i, v0_i, q_i in zip(pv.v, pv._param_data['v0'], pv.q)]
+        self.assertEqual(results[equation], expected)
+        self.assertEqual(list(pv._gcall_int_symbolic['q']), expected)
+
+    def test_compute_all(self):
+        # the fused evaluation gives the results of the three stages called one after another
+        def make_system():
+            system = System()
+            for idx in range(3):
+                system.bus.add_element(idx=idx)
+            system.line.add_element(idx=0, bus1=0, bus2=1, r=0.01, x=0.1, b=0.02, tap=1.05)
+            system.line.add_element(idx=1, bus1=1, bus2=2, x=0.2, phi=0.1)
+            system.shunt.add_element(idx=0, bus=2, g=0.1, b=0.3)
+            devices = ['bus', 'line', 'shunt']
+            for stage in ('metadata_check', 'init_symbols', 'init_data', 'get_var_address', 'get_algeb_ext'):
+                system.call_devices(stage, devices=devices)
+            return system
+
+        for subs_param_value in (False, True):
+            fused, stages = make_system(), make_system()
+            for dev in ('line', 'shunt'):
+                fused.__dict__[dev].compute_all(subs_param_value=subs_param_value)
+                device = stages.__dict__[dev]
+                device.compute_param_int(subs_param_value=subs_param_value)
+                device.compute_param_custom()
+                device.compute_variable(subs_param_value=subs_param_value)
+
+                names = [*fused.line._param_int_computed, 'Y'] if dev == 'line' else ['pd', 'qd']
+                for name in names:
+                    self.assertEqual(fused.__dict__[dev].__dict__[name], stages.__dict__[dev].__dict__[name], name)
+                self.assertEqual(fused.__dict__[dev]._var_int_computed_symbolic_singleton,
+                                 stages.__dict__[dev]._var_int_computed_symbolic_singleton)
+
+    def test_empty_device(self):
+        # devices without elements skip every stage
+        pv = self.system.pv
+        self.assertEqual(pv.n, 0)
+        pv.metadata_check()
+        self.assertFalse(pv.init_data())
+        pv.get_var_address()
+        pv.get_algeb_ext()
+        pv.compute_param_int()
+        pv.compute_variable()
+        pv.make_gcall_ext_symbolic()
+        pv.make_gcall_int_symbolic()
+        pv.delayed_symbol_sub_all(subs_param_value=True)
+        pv.compute_and_set_initial_values()
+
+        self.assertEqual(pv._dae_address, {})
+        self.assertEqual(pv._gcall_ext_symbolic, {})
+
+
+class TestDeviceData(unittest.TestCase):
+    def test_single_buffer(self):
+        data = DeviceData('PV', ['p0', 'Sn', 'v0'], n_element=3, dtype_map={'Sn': np.float32})
+        self.assertEqual(data.p0.dtype, np.float64)
+        self.assertEqual(data.Sn.dtype, np.float32)
+        self.assertEqual(data.v0.shape, (3, ))
+
+        # all parameters are contiguous views into the same buffer
+        for item in ('p0', 'Sn', 'v0'):
+            self.assertTrue(np.shares_memory(data.__dict__[item], data._buf))
+            self.assertTrue(data.__dict__[item].flags.c_contiguous)
+
+        data.v0[:] = 1
+        np.testing.assert_array_equal(data.p0, 0)
+        np.testing.assert_array_equal(data.v0, 1)
+
+    def test_make_device_data(self):
+        pv = System().pv
+        pv.add_element(idx=0, bus=0, p0=0.4, v0=1.01)
+        pv.add_element(idx=1, bus=1, p0=1.7, qmax=2)
+
+        data = pv.make_device_data()
+        self.assertEqual(data.qmax.dtype, np.float64)
+        np.testing.assert_array_equal(data.p0, [0.4, 1.7])
+        np.testing.assert_array_equal(data.v0, [1.01, 1])
+        np.testing.assert_array_equal(data.qmax, [999, 2])
+        self.assertNotIn('bus', data.__dict__)
@@ -1,14 +1,109 @@
 import unittest
 import logging
 import os
+import shutil
+import tempfile
+import numpy as np
+
+from dian.dae import DAE
 logger = logging.getLogger()
 logger.setLevel(logging.WARNING)
 
 
 class TestPJM5Bus(unittest.TestCase):
-    def test_pjm5bus(self):
+    @classmethod
+    def setUpClass(cls):
+        # run the case once and share the results with all the tests
         cwd = os.getcwd()
         if 'tests' not in cwd:
             cwd = os.path.join(cwd, 'tests')
         test_case = os.path.join(cwd, "pjm5bus.py")
-        exec(open(test_case).read())
+
+        # the specialized module is generated in a temporary cache directory
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.environ = os.environ.get('DIAN_CACHE_DIR')
+        os.environ['DIAN_CACHE_DIR'] = cls.cache_dir
+
+        cls.namespace = {'__file__': test_case}
+        exec(open(test_case).read(), cls.namespace)
+        cls.system = cls.namespace['system']
+        cls.sol = cls.namespace['sol']
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.environ is None:
+            del os.environ['DIAN_CACHE_DIR']
+        else:
+            os.environ['DIAN_CACHE_DIR'] = cls.environ
+        shutil.rmtree(cls.cache_dir)
+
+    def test_pjm5bus(self):
+        dae = self.system.dae
+        y_pairs = dict(zip(dae.y, self.sol.tolist()))
+        np.testing.assert_allclose([complex(eq.xreplace(y_pairs)) for eq in dae.g], 0, atol=1e-8)
+
+    def test_gcall_symbolic(self):
+        # with the parameter values substituted, the equations of all devices depend only on the dae variables
+        y_pairs = dict(zip(self.system.dae.y, self.sol.tolist()))
+        for dev in ('bus', 'pq', 'line', 'pv', 'slack'):
+            dev_ref = self.system.__dict__[dev]
+            for dict_name in ('_gcall_int_symbolic', '_gcall_ext_symbolic'):
+                for var, equations in dev_ref.__dict__[dict_name].items():
+                    for eq in equations:
+                        self.assertLessEqual(eq.free_symbols, set(self.system.dae.y), f'{dev}.{var}')
+                        self.assertTrue(np.isfinite(complex(eq.xreplace(y_pairs))), f'{dev}.{var}')
+
+    def test_ybus_numeric(self):
+        system = self.system
+        line = system.line
+
+        ybus = line.make_ybus_numeric()
+        self.assertEqual(ybus.dtype, np.complex128)
+
+        # the numeric admittances match the symbolic `Y` with the parameter values
+        y_symbolic = line._param_int_custom_symbolic['Y']
+        param_pairs = {sym: line._param_data[str(sym).split('_')[1]][int(str(sym).split('_')[2])]
+                       for sym in y_symbolic.free_symbols}
+        expected = np.array(y_symbolic.xreplace(param_pairs).evalf(), dtype=complex)
+        np.testing.assert_allclose(ybus.toarray(), expected)
+
+        # the line equations use the complex Ybus, and match `V * conj(Ybus @ V)` at the solution
+        np.testing.assert_allclose(np.array(line.Y, dtype=complex), ybus.toarray())
+        sol = self.sol
+        y_pairs = dict(zip(system.dae.y, sol.tolist()))
+        vc = sol[system.bus._dae_address['v']] * np.exp(1j * sol[system.bus._dae_address['a']])
+        injection = vc * np.conj(ybus @ vc)
+        for var, part in (('a', injection.real), ('v', injection.imag)):
+            expected = [float(eq.xreplace(y_pairs)) for eq in line._gcall_ext_symbolic[var]]
+            np.testing.assert_allclose(part, expected, atol=1e-8)
+
+    def test_kernels(self):
+        # the numeric kernels of the devices, including the line injections from the sparse Ybus, give the
+        # residual and the Jacobian of the symbolic equations
+        system = self.system
+        dae = DAE(system=system)
+        dae.m = system.dae.m
+        dae.lambdify_algebs(backend='kernels')
+
+        y = self.sol * 1.01
+        np.testing.assert_allclose(dae.g_func(y), system.dae.g_func(y), atol=1e-10)
+        np.testing.assert_allclose(dae.eval_jac(y).toarray(), system.dae.eval_jac(y).toarray(), atol=1e-10)
+        np.testing.assert_allclose(dae.newton_sparse(system.dae.y_num), self.sol, atol=1e-8)
+
+    def test_load_cached_specialized(self):
+        # the module generated by the first run is reused by a second load from the same cache directory,
+        # without building the equations again
+        cache_dir = self.namespace['cache_dir']
+        self.assertEqual(cache_dir, self.cache_dir)
+        files = sorted(os.listdir(cache_dir))
+        modules = [name for name in files if name.startswith('dian_specialized_') and name.endswith('.py')]
+        self.assertEqual(len(modules), 1)
+        mtimes = {name: os.stat(os.path.join(cache_dir, name)).st_mtime_ns for name in modules}
+
+        def build():
+            raise AssertionError('the cached module is not found')
+
+        module = self.system.dae.load_cached_specialized(cache_dir, build=build)
+        self.assertIn(os.path.basename(module.__file__), modules)
+        self.assertEqual(sorted(os.listdir(cache_dir)), files)
+        self.assertEqual({name: os.stat(os.path.join(cache_dir, name)).st_mtime_ns for name in modules}, mtimes)